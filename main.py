@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 
@@ -9,6 +10,8 @@ except ImportError as e:
 
 
 if __name__ == "__main__":
+    # 打包后的程序使用多进程解析pdsc时需要
+    multiprocessing.freeze_support()
     QApplication.setAttribute(Qt.ApplicationAttribute.AA_EnableHighDpiScaling)
     app = QApplication(sys.argv)
     window = DAPLinkProgUI()
@@ -1,6 +1,13 @@
 from typing import Optional
+from elftools.common.exceptions import ELFError
+from elftools.elf.elffile import ELFFile
+import array
+import binascii
 import logging
 import copy
+import mmap
+import os
+import sys
 
 
 class HexBinTool:
@@ -34,56 +41,187 @@ class HexBinTool:
     HEX_TYPE_START_SEG_ADDRESS = 3
     HEX_TYPE_EXT_LINEAR_ADDRESS = 4
     HEX_TYPE_START_LINEAR_ADDRESS = 5
+    # 批量处理等长数据记录时每次最少/最多检查的记录数
+    HEX_RUN_MIN = 16
+    HEX_RUN_MAX = 0x10000
+    # 校验和按16位通道累加，记录长度超过该值时可能溢出到相邻通道，只能逐条处理
+    HEX_RUN_MAX_LENGTH = 0xFFFF // 0xFF - 5
+
+    # srec数据记录类型及对应的地址字节数
+    SREC_DATA_ADDR_SIZE = {b'1': 2, b'2': 3, b'3': 4}
+    # 文件扩展名对应的文件类型
+    FILE_TYPES = {
+        'bin': 'bin',
+        'hex': 'hex',
+        'elf': 'elf',
+        'axf': 'elf',
+        'out': 'elf',
+        'srec': 'srec',
+        's19': 'srec',
+        's28': 'srec',
+        's37': 'srec',
+        'mot': 'srec',
+    }
 
     def get_parse_data_info(self):
         return copy.deepcopy(self.parse_data_info)
 
     def hex_to_bin_from_file(self, fpath: str) -> Optional[dict]:
-        data = self._get_data_from_file(fpath)
-        if data is None:
+        """
+        解析hex文件，连续地址的数据记录合并为一个数据段
+        文件内容一次去掉':'和换行并整体转换为二进制；长度相同、地址连续的数据记录按固定步长切片
+        批量校验和拷贝（见_get_hex_data_run），其他记录逐条处理；数据段按总长度预先分配后填充
+        """
+        text = self._get_data_from_file(fpath)
+        if text is None:
             logging.error(f"Failed to read file: {fpath}")
             return None
-        lines = data.splitlines()
-        ret = self.get_parse_data_info()
+        # 忽略结束记录之后的内容
+        eof = max(text.find(b':00000001FF'), text.find(b':00000001ff'))
+        if eof >= 0:
+            text = text[:eof + 11]
+        text = text.lstrip()
+        if not text.startswith(b':'):
+            logging.error("Invalid hex file format")
+            return None
+        try:
+            records = binascii.unhexlify(text.translate(None, b': \t\r\n'))
+        except binascii.Error:
+            logging.error("Invalid hex file format")
+            return None
+
+        # 第一遍：校验记录并计算各数据段的地址和大小
+        segments = []   # [起始地址, 大小, [(段内偏移, 第一条记录中数据的偏移, 每条记录的数据长度, 记录数), ...]]
         base_addr = 0
         segment_addr = 0
         next_addr = -1
-        count = -1
-        for line in lines:
-            if line[0] != ord(':'):
+        record_count = 0
+        offset = 0
+        end = len(records)
+        eof_found = False
+        run_limit = self.HEX_RUN_MIN
+        while offset < end:
+            length = records[offset]
+            count = self._get_hex_data_run(records, offset, run_limit)
+            if count > 1:
+                addr = ((records[offset + 1] << 8) | records[offset + 2]) + base_addr + segment_addr
+                if addr != next_addr:
+                    segments.append([addr, 0, []])
+                segment = segments[-1]
+                segment[2].append((segment[1], offset + 4, length, count))
+                segment[1] += length * count
+                next_addr = addr + length * count
+                record_count += count
+                offset += (length + 5) * count
+                # 检查范围内的记录全部可批量处理时扩大下次检查的范围
+                run_limit = min(run_limit * 2, self.HEX_RUN_MAX) if count == run_limit else self.HEX_RUN_MIN
+                continue
+            record_end = offset + length + 5
+            if record_end > end:
                 logging.error("Invalid hex file format")
                 return None
-            type = int(line[7:9], 16)
+            record_count += 1
+            if sum(records[offset:record_end]) & 0xFF != 0:
+                offset_addr = (records[offset + 1] << 8) | records[offset + 2]
+                logging.error(f"Checksum error at address {hex(offset_addr + base_addr + segment_addr)}")
+                return None
+            type = records[offset + 3]
             if type == self.HEX_TYPE_DATA:
-                length = int(line[1:3], 16)
-                addr = int(line[3:7], 16) + base_addr + segment_addr
-                if addr != next_addr or next_addr == -1:
-                    ret['data'].append(bytearray())
-                    ret['addr'].append(addr)
-                    ret['size'].append(0)
-                    ret['count'] += 1
+                addr = ((records[offset + 1] << 8) | records[offset + 2]) + base_addr + segment_addr
+                if addr != next_addr:
+                    segments.append([addr, 0, []])
+                segment = segments[-1]
+                segment[2].append((segment[1], offset + 4, length, 1))
+                segment[1] += length
                 next_addr = addr + length
-                # 处理数据
-                data = bytes.fromhex(line[9:9 + length * 2].decode('utf-8'))
-                checksum = length + (addr >> 8) + (addr & 0xFF) + type
-                checksum += sum(data)
-                if (256 - checksum) & 0xFF != int(line[-2:], 16):
-                    logging.error(f"Checksum error at address {hex(addr)}")
-                    return None
-                ret['data'][count].extend(data)
-                ret['size'][count] += length
             elif type == self.HEX_TYPE_EOF:
-                ret['type'] = 'hex'
-                return ret
+                eof_found = True
+                break
             elif type == self.HEX_TYPE_EXT_SEG_ADDRESS:
-                segment_addr = int(line[9:13], 16) << 4
+                segment_addr = ((records[offset + 4] << 8) | records[offset + 5]) << 4
             elif type == self.HEX_TYPE_EXT_LINEAR_ADDRESS:
-                base_addr = int(line[9:13], 16) << 16
+                base_addr = ((records[offset + 4] << 8) | records[offset + 5]) << 16
+            offset = record_end
 
-        return None
+        # 每条记录必须以':'开头，记录数与':'的数量不一致说明某行长度有误
+        if not eof_found or record_count != text.count(b':'):
+            logging.error("Invalid hex file format")
+            return None
+
+        # 第二遍：按段大小分配缓冲区并填充数据
+        ret = self.get_parse_data_info()
+        for addr, size, chunks in segments:
+            data = bytearray(size)
+            for data_offset, record_offset, length, count in chunks:
+                if count == 1:
+                    data[data_offset:data_offset + length] = records[record_offset:record_offset + length]
+                    continue
+                # 按列拷贝：每次把所有记录的同一个数据字节按步长复制到目标位置
+                stride = length + 5
+                for column in range(length):
+                    data[data_offset + column : data_offset + count * length : length] = \
+                        records[record_offset + column : record_offset + count * stride : stride]
+            ret['data'].append(data)
+            ret['addr'].append(addr)
+            ret['size'].append(size)
+        ret['count'] = len(segments)
+        ret['type'] = 'hex'
+        return ret
+
+    def _get_hex_data_run(self, records: bytes, offset: int, limit: int) -> int:
+        """
+        从offset开始，按固定步长检查长度相同、地址连续且校验和正确的数据记录
+        长度字节、类型字节和地址字节分别按步长切片后整体比较；各记录的校验和把每列字节放入
+        大整数的16位通道中累加，一次得到所有记录的字节和
+        :param limit: 最多检查的记录数
+        :return: 可批量处理的记录数，小于2时应逐条处理（包括出错的记录，由逐条处理报告错误）
+        """
+        length = records[offset]
+        if length == 0 or length > self.HEX_RUN_MAX_LENGTH:
+            return 0
+        stride = length + 5
+        addr = (records[offset + 1] << 8) | records[offset + 2]
+        # 记录中的地址为16位，批量范围不跨越64KB
+        count = min(limit, (len(records) - offset) // stride, (0x10000 - addr) // length)
+        if count < 2:
+            return 0
+        run_end = offset + count * stride
+        count -= len(records[offset : run_end : stride].lstrip(bytes([length])))
+        run_end = offset + count * stride
+        count -= len(records[offset + 3 : run_end : stride].lstrip(bytes([self.HEX_TYPE_DATA])))
+        if count < 2:
+            return 0
+        run_end = offset + count * stride
+
+        # 地址连续：各记录的地址（大端序）与等差数列比较
+        addrs = bytearray(count * 2)
+        addrs[0::2] = records[offset + 1 : run_end : stride]
+        addrs[1::2] = records[offset + 2 : run_end : stride]
+        expected = array.array('H', range(addr, addr + count * length, length))
+        if sys.byteorder == 'little':
+            expected.byteswap()
+        diff = int.from_bytes(addrs, 'big') ^ int.from_bytes(expected, 'big')
+        if diff:
+            count = (len(addrs) * 8 - diff.bit_length()) // 16
+            if count < 2:
+                return 0
+            run_end = offset + count * stride
+
+        # 校验和：每条记录所有字节之和的低8位为0
+        lanes = bytearray(count * 2)
+        total = 0
+        for column in range(stride):
+            lanes[0::2] = records[offset + column : run_end : stride]
+            total += int.from_bytes(lanes, 'little')
+        sums = total.to_bytes(count * 2, 'little')[0::2]
+        count -= len(sums.lstrip(b'\x00'))
+        return count if count >= 2 else 0
 
     def bin_from_from_file(self, fpath: str) -> Optional[dict]:
-        data = self._get_data_from_file(fpath)
+        """
+        bin文件映射到内存，数据为只读memoryview，不读入整个文件
+        """
+        data = self._map_file(fpath)
         if data is None:
             logging.error(f"Failed to read file: {fpath}")
             return None
@@ -96,29 +234,103 @@ class HexBinTool:
 
         return ret
 
-    def check_data_to_align_4(self, parse_data: Optional[dict]) -> Optional[dict]:
-        if parse_data is None:
+    def elf_to_bin_from_file(self, fpath: str) -> Optional[dict]:
+        """
+        读取elf/axf文件中的PT_LOAD段，按加载地址(p_paddr)返回，只包含文件中有数据的部分(p_filesz)
+        """
+        ret = self.get_parse_data_info()
+        try:
+            with open(fpath, 'rb') as f:
+                elf = ELFFile(f)
+                for segment in elf.iter_segments():
+                    if segment['p_type'] != 'PT_LOAD' or segment['p_filesz'] == 0:
+                        continue
+                    ret['data'].append(bytearray(segment.data()[:segment['p_filesz']]))
+                    ret['addr'].append(segment['p_paddr'])
+                    ret['size'].append(segment['p_filesz'])
+                    ret['count'] += 1
+        except FileNotFoundError:
+            logging.error(f"file (path: {fpath}) not found")
+            return None
+        except ELFError as e:
+            logging.error(f"Invalid elf file: {e}")
             return None
-        ret = parse_data
-        for i in range(ret['count']):
-            if ret['size'][i] % 4 != 0:
-                logging.warning(f"data size at index {i} is not aligned to 4 bytes, padding with 0xFF.")
-                padding = 4 - (ret['size'][i] % 4)
-                ret['data'][i].extend(b'\xFF' * padding)
-                ret['size'][i] += padding
+        if ret['count'] == 0:
+            logging.error("No loadable segment in elf file")
+            return None
+        ret['type'] = 'elf'
+        return ret
 
+    def srec_to_bin_from_file(self, fpath: str) -> Optional[dict]:
+        """
+        逐行解析Motorola S-record文件，连续地址的数据记录合并为一个数据段
+        S1/S2/S3为数据记录，S7/S8/S9为结束记录，其他记录只校验
+        """
+        ret = self.get_parse_data_info()
+        next_addr = -1
+        try:
+            with open(fpath, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if line[:1] != b'S' or len(line) < 4:
+                        logging.error("Invalid srec file format")
+                        return None
+                    try:
+                        record = bytes.fromhex(line[2:].decode('ascii'))
+                    except ValueError:
+                        logging.error("Invalid srec file format")
+                        return None
+                    if record[0] != len(record) - 1:
+                        logging.error("Invalid srec file format")
+                        return None
+                    if sum(record) & 0xFF != 0xFF:
+                        logging.error(f"Checksum error in record {line[:12].decode('ascii', 'replace')}")
+                        return None
+                    record_type = line[1:2]
+                    if record_type in self.SREC_DATA_ADDR_SIZE:
+                        addr_size = self.SREC_DATA_ADDR_SIZE[record_type]
+                        addr = int.from_bytes(record[1:1 + addr_size], 'big')
+                        data = record[1 + addr_size:-1]
+                        if addr != next_addr:
+                            ret['data'].append(bytearray())
+                            ret['addr'].append(addr)
+                            ret['size'].append(0)
+                            ret['count'] += 1
+                        ret['data'][-1].extend(data)
+                        ret['size'][-1] += len(data)
+                        next_addr = addr + len(data)
+                    elif record_type in (b'7', b'8', b'9'):
+                        ret['type'] = 'srec'
+                        return ret
+        except FileNotFoundError:
+            logging.error(f"file (path: {fpath}) not found")
+            return None
+        # 没有结束记录时使用已读取的数据
+        if ret['count'] == 0:
+            logging.error("No data record in srec file")
+            return None
+        ret['type'] = 'srec'
         return ret
 
-    def bytes_to_dword(self, bytes, size, format = 'little') -> Optional[list]:
-        if size % 4 != 0:
+    def bytes_to_word_view(self, data, byteorder = 'little') -> Optional[memoryview]:
+        """
+        字节数据按32位字访问，字节序与主机相同时直接转换视图，不复制数据
+        :param data: 任意支持缓冲区协议的对象，大小需4字节对齐
+        :param byteorder: 数据的字节序，'little'或'big'
+        :return: 格式为'I'的memoryview，可直接传给DAPHandler的写内存接口
+        """
+        view = memoryview(data).cast('B')
+        if len(view) % 4 != 0:
             logging.error("Size must be a multiple of 4.")
             return None
-        dword = []
-        byteorder = 'little' if format == 'little' else 'big'
-        for i in range(size // 4):
-            dword.append(int.from_bytes(bytes[i*4:(i+1)*4], byteorder=byteorder))
-
-        return dword
+        if byteorder == sys.byteorder:
+            return view.cast('I')
+        words = array.array('I')
+        words.frombytes(view)
+        words.byteswap()
+        return memoryview(words)
 
     def print_hex_to_bin_info(self, parse_data: Optional[dict]):
         if parse_data is None:
@@ -143,6 +355,20 @@ class HexBinTool:
                     ' '.join([hex(b)[2:].zfill(2) for b in parse_data['data'][i][(parse_data['size'][i] // 16) * 16:]])
                 )
 
+    def _map_file(self, fpath: str) -> Optional[memoryview]:
+        """只读映射文件，映射在返回的memoryview释放后关闭"""
+        try:
+            with open(fpath, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b'')
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            logging.error(f"file (path: {fpath}) not found")
+            return None
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to map file (path: {fpath}): {e}")
+            return None
+
     def _get_data_from_file(self, fpath: str) -> Optional[bytes]:
         try:
             with open(fpath, 'rb') as f:
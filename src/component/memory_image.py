@@ -0,0 +1,155 @@
+from typing import Optional
+import bisect
+import logging
+
+
+class PaddedView:
+    """
+    前后带填充值的只读数据视图，填充部分不实际分配
+    切片完全落在数据内时返回原数据的memoryview（不复制），否则返回拼接后的bytes
+    """
+    def __init__(self, head_size: int, body, tail_size: int, fill: int):
+        self.head_size = head_size
+        self.body = memoryview(body).cast('B')
+        self.tail_size = tail_size
+        self.fill_byte = bytes([fill & 0xFF])
+
+    def __len__(self):
+        return self.head_size + len(self.body) + self.tail_size
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("PaddedView index out of range")
+            if self.head_size <= index < self.head_size + len(self.body):
+                return self.body[index - self.head_size]
+            return self.fill_byte[0]
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError("PaddedView only supports step 1")
+        if stop <= start:
+            return b''
+        body_start = self.head_size
+        body_end = body_start + len(self.body)
+        if start >= body_start and stop <= body_end:
+            return self.body[start - body_start : stop - body_start]
+        head = max(0, min(stop, body_start) - start)
+        tail = max(0, stop - max(start, body_end))
+        body = self.body[max(start, body_start) - body_start : max(min(stop, body_end), body_start) - body_start]
+        return self.fill_byte * head + body.tobytes() + self.fill_byte * tail
+
+
+class MemoryImage:
+    """
+    稀疏内存镜像
+    数据段按起始地址排序保存，通过二分查找定位；添加数据时检查重叠，首尾相接的数据段自动合并
+    添加的数据以memoryview保存，不复制；只有合并数据段时才复制
+    """
+    def __init__(self):
+        self._addrs = []    # 各数据段起始地址，升序
+        self._datas = []    # 各数据段数据
+
+    def __len__(self):
+        return len(self._addrs)
+
+    @classmethod
+    def from_parse_data(cls, parse_data: dict) -> Optional['MemoryImage']:
+        """由HexBinTool的解析结果创建，数据重叠时返回None"""
+        image = cls()
+        for i in range(parse_data['count']):
+            if not image.add(parse_data['addr'][i], memoryview(parse_data['data'][i])[:parse_data['size'][i]]):
+                return None
+        return image
+
+    def add(self, addr: int, data) -> bool:
+        """
+        添加数据
+        :return: 与已有数据重叠时返回False
+        """
+        if len(data) == 0:
+            return True
+        end = addr + len(data)
+        i = bisect.bisect_right(self._addrs, addr)
+        prev_end = self._addrs[i - 1] + len(self._datas[i - 1]) if i > 0 else None
+        if (prev_end is not None and prev_end > addr) or (i < len(self._addrs) and self._addrs[i] < end):
+            logging.error(f"Data overlap at address 0x{addr:08X}, size: {len(data)}.")
+            return False
+        if prev_end == addr:
+            i -= 1
+            self._datas[i] = self._join(self._datas[i], data)
+        else:
+            self._addrs.insert(i, addr)
+            self._datas.insert(i, memoryview(data).cast('B'))
+        if i + 1 < len(self._addrs) and self._addrs[i] + len(self._datas[i]) == self._addrs[i + 1]:
+            self._datas[i] = self._join(self._datas[i], self._datas.pop(i + 1))
+            self._addrs.pop(i + 1)
+        return True
+
+    @staticmethod
+    def _join(data, next_data) -> bytearray:
+        # 保存的bytearray都是合并时创建的，可以直接追加；memoryview引用的是外部数据，需要复制
+        if not isinstance(data, bytearray):
+            data = bytearray(data)
+        data += next_data
+        return data
+
+    def segments(self):
+        """按地址顺序返回(起始地址, 数据)"""
+        return zip(self._addrs, self._datas)
+
+    def align(self, page_size: int, fill: int) -> 'MemoryImage':
+        """
+        按页对齐
+        每个数据段扩展到整页，落在同一页或相邻页的数据段合并为一段，空隙用fill填充
+        单独的数据段通过PaddedView在首尾虚拟填充，不复制数据；需要合并的数据段复制到新的bytearray
+        :param page_size: 页大小
+        :param fill: 填充值，一般为flash的擦除值
+        :return: 数据为memoryview、PaddedView或bytearray，均支持len()和切片
+        """
+        # 按对齐后的范围分组：[[(地址, 数据), ...], ...]
+        groups = []
+        group_end = None
+        for addr, data in self.segments():
+            page_addr = addr - addr % page_size
+            if groups and group_end >= page_addr:
+                groups[-1].append((addr, data))
+            else:
+                groups.append([(addr, data)])
+            data_end = addr + len(data)
+            group_end = data_end + (-data_end) % page_size
+
+        ret = MemoryImage()
+        fill_byte = bytes([fill & 0xFF])
+        for group in groups:
+            start_addr = group[0][0] - group[0][0] % page_size
+            data_end = group[-1][0] + len(group[-1][1])
+            tail_size = (-data_end) % page_size
+            if len(group) == 1:
+                head_size = group[0][0] - start_addr
+                if head_size == 0 and tail_size == 0:
+                    ret_data = group[0][1]
+                else:
+                    ret_data = PaddedView(head_size, group[0][1], tail_size, fill)
+            else:
+                ret_data = bytearray()
+                next_addr = start_addr
+                for addr, data in group:
+                    ret_data += fill_byte * (addr - next_addr)
+                    ret_data += data
+                    next_addr = addr + len(data)
+                ret_data += fill_byte * tail_size
+            ret._addrs.append(start_addr)
+            ret._datas.append(ret_data)
+        return ret
+
+    def to_parse_data(self, data_type: str = '') -> dict:
+        """转换为HexBinTool的解析结果格式"""
+        return {
+            'data': list(self._datas),
+            'addr': list(self._addrs),
+            'size': [len(data) for data in self._datas],
+            'count': len(self._addrs),
+            'type': data_type,
+        }
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import os
+import zipfile
+
+
+class PackFile:
+    """
+    CMSIS .pack文件（zip格式）读取，不需要解压
+    路径"<xxx.pack>/<成员路径>"视为pack中的文件，其他路径按普通文件处理
+    打开的pack按LRU保留，只读取一次目录，成员按需读取
+    """
+    PACK_SUFFIX = '.pack'
+    MAX_OPEN_PACKS = 8
+
+    _archives = OrderedDict()   # {pack路径: (mtime_ns, ZipFile, {小写成员名: 成员名})}
+
+    @staticmethod
+    def is_pack(path) -> bool:
+        return str(path).lower().endswith(PackFile.PACK_SUFFIX)
+
+    @staticmethod
+    def split_path(path) -> Optional[tuple]:
+        """
+        拆分pack中文件的路径
+        :return: (pack路径, 成员路径)，不是pack中的文件时返回None
+        """
+        path = str(path).replace('\\', '/')
+        index = path.lower().find(PackFile.PACK_SUFFIX + '/')
+        while index >= 0:
+            pack_path = path[:index + len(PackFile.PACK_SUFFIX)]
+            if os.path.isfile(pack_path):
+                return pack_path, path[index + len(PackFile.PACK_SUFFIX) + 1:]
+            index = path.lower().find(PackFile.PACK_SUFFIX + '/', index + 1)
+        return None
+
+    @staticmethod
+    def join_path(pack_path, member: str) -> str:
+        return f"{Path(pack_path).as_posix()}/{member.replace(chr(92), '/').lstrip('/')}"
+
+    @classmethod
+    def list_pdsc(cls, pack_path) -> list:
+        """返回pack根目录下的pdsc文件路径"""
+        _, names = cls._get_archive(pack_path)
+        return [cls.join_path(pack_path, name) for name in names.values()
+                if '/' not in name and name.lower().endswith('.pdsc')]
+
+    @classmethod
+    def get_stamp(cls, path) -> tuple:
+        """
+        返回文件的(修改时间, 大小)，用于判断缓存是否有效
+        pack中的文件使用pack的修改时间和成员大小
+        """
+        split = cls.split_path(path)
+        if split is None:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        archive, _ = cls._get_archive(split[0])
+        return os.stat(split[0]).st_mtime_ns, archive.getinfo(cls._get_member(*split)).file_size
+
+    @classmethod
+    def open(cls, path):
+        """以二进制只读方式打开文件"""
+        split = cls.split_path(path)
+        if split is None:
+            return open(path, 'rb')
+        archive, _ = cls._get_archive(split[0])
+        return archive.open(cls._get_member(*split))
+
+    @classmethod
+    def read(cls, path) -> bytes:
+        with cls.open(path) as f:
+            return f.read()
+
+    @classmethod
+    def _get_member(cls, pack_path, member: str) -> str:
+        # pdsc中的路径可能使用'\'且大小写与pack中不一致
+        _, names = cls._get_archive(pack_path)
+        name = names.get(member.replace('\\', '/').lstrip('/').lower())
+        if name is None:
+            raise FileNotFoundError(f"{member} not found in {pack_path}")
+        return name
+
+    @classmethod
+    def _get_archive(cls, pack_path):
+        key = Path(pack_path).as_posix()
+        mtime = os.stat(key).st_mtime_ns
+        entry = cls._archives.get(key)
+        if entry is not None and entry[0] == mtime:
+            cls._archives.move_to_end(key)
+            return entry[1], entry[2]
+        if entry is not None:
+            entry[1].close()
+        archive = zipfile.ZipFile(key)
+        names = {name.lower(): name for name in archive.namelist()}
+        cls._archives[key] = (mtime, archive, names)
+        while len(cls._archives) > cls.MAX_OPEN_PACKS:
+            _, (_, old_archive, _) = cls._archives.popitem(last=False)
+            old_archive.close()
+        return archive, names
@@ -2,8 +2,29 @@ import usb.core
 import usb.util
 from src.usb_device.usb_device_handle import USBDeviceHandle
 from src.dap.cortex_m import DEBUG_REG, SCB_REG, ROM_TABLE, ExecuteOperation
+import sys
 import time
+import array
+import struct
 import logging
+from collections import deque
+from typing import Union
+
+
+"""
+DAPSession类记录一次完整操作（擦除、烧录等）期间的DAP会话状态。
+会话开启后USB接口只配置一次、SWD只连接一次，DP/AP状态一直保持到会话结束。
+"""
+class DAPSession:
+    def __init__(self):
+        self.active = False         # 会话是否开启
+        self.configured = False     # USB接口是否已配置
+        self.connected = False      # SWD是否已连接，DP/AP是否已初始化
+
+    def clear(self):
+        self.active = False
+        self.configured = False
+        self.connected = False
 
 
 """
@@ -35,6 +56,14 @@ class DAPHandler:
 
         self._coresight_component_table = ROM_TABLE().get_component_table()
 
+        self.session = DAPSession()
+
+        self._command_buffer = bytearray(self.dap_packet_size)  # 可复用的命令缓冲区
+        self._response_buffer = usb.util.create_buffer(self.dap_packet_size)  # 可复用的响应缓冲区
+        self._pending_commands = deque()  # 已发送但尚未读取响应的命令，元素为(回调函数, 回调参数)
+        self._lost_responses = 0  # 读取超时、仍可能迟到的响应数量
+        self._execute_operation_packets = {}  # 按寄存器模板缓存的执行操作命令包
+
     @property
     def get_selected_dap_device(self):
         return self.usb_device_handle.get_selected_dap_device
@@ -52,11 +81,48 @@ class DAPHandler:
         return self.usb_device_handle.select_dap_device_by_intf_desc_and_sn(intf_desc, serial_number)
 
     def config_dap_device(self):
-        return self.usb_device_handle.config_dap_device()
+        if self.session.active and self.session.configured:
+            return True
+        res = self.usb_device_handle.config_dap_device()
+        if res and self.session.active:
+            self.session.configured = True
+        return res
 
     def unconfig_dap_device(self):
+        if self.session.active:
+            # 会话期间保持接口，由close_session统一释放
+            return True
         return self.usb_device_handle.unconfig_dap_device()
 
+    def open_session(self) -> bool:
+        """
+        开启DAP会话，会话期间:
+        config_dap_device只在首次调用时复位探针并配置接口，unconfig_dap_device不再释放接口；
+        SWD连接及DP/AP初始化只执行一次，_stop_dap_device推迟到close_session执行。
+        """
+        self.close_session()
+        self.session.active = True
+        if self.config_dap_device() is False:
+            self.session.clear()
+            return False
+        return True
+
+    def close_session(self) -> bool:
+        """
+        结束DAP会话，断开SWD连接并释放USB接口。
+        """
+        if self.session.active is False:
+            return True
+        configured = self.session.configured
+        self.session.clear()
+        res = True
+        if configured:
+            if self._stop_dap_device() is False:
+                res = False
+            if self.unconfig_dap_device() is False:
+                res = False
+        return res
+
     def unconfig_all_dap_devices(self):
         return self.usb_device_handle.unconfig_all_dap_devices()
 
@@ -106,6 +172,8 @@ class DAPHandler:
                 retry_count -= 1
                 if (res & 0x80) | (retry_count <= 0):
                     break
+            # 硬件复位后DP/AP状态可能丢失，会话中的后续操作需要重新连接
+            self.session.connected = False
 
         if self._stop_dap_device() is False:
             return False
@@ -120,9 +188,14 @@ class DAPHandler:
     download_algorithm: 下载算法到目标设备的内存中，并可选择验证下载的数据。
     注意在操作flash前需使用该函数将算法下载到目标设备的内存中。后续调用这些算法执行flash操作。
     download_data_to_prog_ram: 下载数据到目标设备的编程内存中，用于传输烧录数据。
+    read_memory/write_memory: 按字节读写目标内存（目标已连接时调用）。
     target_flash_init: 初始化flash操作。
     target_flash_erase: 擦除flash操作。
+    target_flash_erase_sectors: 由目标上的程序按扇区列表连续擦除。
+    target_crc32: 由目标上的程序按块计算一段内存的CRC32。
+    target_flash_blank_check/target_flash_verify: 调用算法的BlankCheck/Verify函数（算法提供时）。
     target_flash_program: 编程flash操作。
+    target_flash_program_start/target_flash_program_wait: 启动编程后立即返回，等待期间可以下载下一页数据。
     target_flash_uninit: 结束flash操作。
     """
     def target_flash_operation_init(self) -> bool:
@@ -144,12 +217,15 @@ class DAPHandler:
         return True
 
     def download_algorithm(self, start_addr, algorithm, algorithm_size, verify_flag: bool) -> bool:
+        """
+        :param algorithm: 32位整数列表，或任意支持缓冲区协议的对象（ctypes数组、array('I')、memoryview等）
+        """
         if self._write_target_memory(start_addr, algorithm_size, algorithm) is False:
             return False
         if verify_flag:
-            algorithm_size = (algorithm_size + 4 - 1) // 4
-            verify_value = self.get_xor_value(algorithm, algorithm_size)
-            if self.verify_target_data(start_addr, algorithm_size * 4, verify_value) is False:
+            # 回读后逐字节比较
+            read_data = self.read_memory(start_addr, algorithm_size)
+            if read_data is False or read_data != self._to_byte_view(algorithm)[:algorithm_size]:
                 logging.error("download algorithm verify error")
                 return False
 
@@ -159,7 +235,14 @@ class DAPHandler:
         return True
 
     def download_data_to_prog_ram(self, start_addr, data, data_size) -> bool:
-        return self._write_target_memory(start_addr, data_size, data)
+        """
+        :param data: 32位整数列表，或任意支持缓冲区协议的对象（按小端序字节写入）
+        """
+        write_view = self._to_byte_view(data)
+        if len(write_view) < data_size:
+            logging.error("Write data is shorter than write size.")
+            return False
+        return self.write_memory(start_addr, write_view[:data_size])
 
     def target_flash_init(self, data: ExecuteOperation) -> bool:
         """
@@ -184,6 +267,82 @@ class DAPHandler:
             return False
         return True
 
+    def target_flash_erase_sectors(self, data: ExecuteOperation, sector_list_addr, sector_count) -> bool:
+        """
+        按扇区列表擦除，列表需先下载到sector_list_addr，并预留一个字保存失败扇区的序号
+        :param data: r15指向扇区列表擦除程序
+        :param sector_list_addr: 扇区地址列表在目标RAM中的地址
+        :param sector_count: 扇区数量
+        """
+        data.r0 = sector_list_addr
+        data.r1 = sector_count
+        ret = self._execute_operation(data)
+        if ret is False:
+            logging.error("Execute operation(flash erase) failed.")
+            return False
+        elif ret != 0:
+            index = []
+            if self._read_target_memory(sector_list_addr + sector_count * 4, 4, index) and index[0] < sector_count:
+                sector_addr = []
+                self._read_target_memory(sector_list_addr + index[0] * 4, 4, sector_addr)
+                logging.error(f"Execute operation(flash erase) failed at sector {index[0]}"
+                              f"(address: 0x{sector_addr[0] if sector_addr else 0:08X}) with return code: {ret}")
+            else:
+                logging.error(f"Execute operation(flash erase) failed with return code: {ret}")
+            return False
+        return True
+
+    def target_flash_blank_check(self, data: ExecuteOperation) -> bool:
+        """
+        调用算法的BlankCheck(adr, sz, pat)函数
+        ret: 0: 区域为空, 1: 区域不为空
+        """
+        ret = self._execute_operation(data)
+        if ret is False:
+            logging.error("Execute operation(flash blank check) failed.")
+            return False
+        elif ret != 0:
+            logging.error(f"Flash is not blank, address: 0x{data.r0:08X}, size: {data.r1}.")
+            return False
+        return True
+
+    def target_flash_verify(self, data: ExecuteOperation) -> bool:
+        """
+        调用算法的Verify(adr, sz, buf)函数
+        ret: adr + sz: 校验成功, 其他: 第一个不一致的地址
+        """
+        ret = self._execute_operation(data)
+        if ret is False:
+            logging.error("Execute operation(flash verify) failed.")
+            return False
+        elif ret != ((data.r0 + data.r1) & 0xFFFFFFFF):
+            logging.error(f"Flash verify failed at address: 0x{ret:08X}.")
+            return False
+        return True
+
+    def target_crc32(self, data: ExecuteOperation, start_addr, block_size, block_count, result_addr):
+        """
+        按块计算一段内存的CRC32，结果与zlib.crc32一致
+        :param data: r15指向CRC32计算程序
+        :param result_addr: 目标RAM中存放结果表的地址，大小为block_count个字
+        :return: 每块的CRC32值列表，失败时返回False
+        """
+        data.r0 = start_addr
+        data.r1 = block_size
+        data.r2 = block_count
+        data.r3 = result_addr
+        ret = self._execute_operation(data)
+        if ret is False:
+            logging.error("Execute operation(crc32) failed.")
+            return False
+        elif ret != 0:
+            logging.error(f"Execute operation(crc32) failed with return code: {ret}")
+            return False
+        crc_values = []
+        if self._read_target_memory(result_addr, block_count * 4, crc_values) is False:
+            return False
+        return crc_values
+
     def target_flash_program(self, data: ExecuteOperation) -> bool:
         ret = self._execute_operation(data)
         if ret is False:
@@ -194,6 +353,29 @@ class DAPHandler:
             return False
         return True
 
+    def target_flash_program_start(self, data: ExecuteOperation) -> bool:
+        """
+        启动flash编程后立即返回，不等待编程结束
+        编程期间可以继续向另一个编程缓冲区下载数据，之后调用target_flash_program_wait等待结果
+        """
+        if self._start_execute_operation(data) is False:
+            logging.error("Execute operation(flash program) failed.")
+            return False
+        return True
+
+    def target_flash_program_wait(self, data: ExecuteOperation) -> bool:
+        """
+        等待target_flash_program_start启动的flash编程结束
+        """
+        ret = self._wait_execute_operation(data.timeout)
+        if ret is False:
+            logging.error("Execute operation(flash program) failed.")
+            return False
+        elif ret != 0:
+            logging.error(f"Execute operation(flash program) failed with return code: {ret}")
+            return False
+        return True
+
     def target_flash_uninit(self, data: ExecuteOperation) -> bool:
         ret = self._execute_operation(data)
         if ret is False:
@@ -207,195 +389,187 @@ class DAPHandler:
     <<<
     """
 
-    def read_target_flash(self, start_addr, size, read_data: list) -> bool:
+    def read_memory(self, start_addr, size) -> Union[bytearray, bool]:
+        """
+        读取目标内存，注意需在目标已连接时调用（如target_flash_operation_init之后或DAP会话中）。
+        :param start_addr: 起始地址，需4字节对齐
+        :param size: 读取大小（字节），需4字节对齐
+        :return: 小端序字节数据，失败返回False
+        """
+        data = bytearray()
+        if self._read_target_memory(start_addr, size, data) is False:
+            return False
+        return data
+
+    def write_memory(self, start_addr, buffer) -> bool:
+        """
+        写目标内存，注意需在目标已连接时调用。
+        :param start_addr: 起始地址，需4字节对齐
+        :param buffer: 32位整数列表，或任意支持缓冲区协议的对象（bytes, bytearray, memoryview, array等），
+                       按小端序字节写入，大小需4字节对齐
+        """
+        write_view = self._to_byte_view(buffer)
+        return self._write_target_memory(start_addr, len(write_view), write_view)
+
+    def read_target_flash(self, start_addr, size) -> Union[bytearray, bool]:
+        """
+        连接目标读取flash，读取后断开连接
+        :return: 小端序字节数据，失败返回False
+        """
         if self._read_target_id() is False:
             return False
-        if self._read_target_memory(start_addr, size, read_data) is False:
+        data = self.read_memory(start_addr, size)
+        if data is False:
             return False
         if self._stop_dap_device() is False:
             return False
-        return True
+        return data
 
-    def verify_target_data(self, start_addr, size, verify_value) -> bool:
-        read_data = []
-        if self._read_target_memory(start_addr, size, read_data) is False:
-            return False
-
-        if self.get_xor_value(read_data, len(read_data)) != verify_value:
-            return False
-        return True
-
-    def _read_target_memory(self, start_addr, size, read_data: list) -> bool:
+    def _read_target_memory(self, start_addr, size, read_data: Union[list, bytearray]) -> bool:
+        """
+        :param read_data: 32位整数列表，或bytearray（按字节填充读取数据）
+        """
         read_data.clear()
-        read_addr = start_addr
-        read_size = size
-        if read_addr % 4 != 0 or read_size % 4 != 0:
+        if start_addr % 4 != 0 or size % 4 != 0:
             logging.error("Read address and size must be 4-byte aligned.")
             return False
 
-        if read_addr % 0x400 != 0:
-            """
-            如果读取地址不是0x400的整数倍，则先读取到下一个0x400对齐地址的数据
-            """
-            first_read_size = (0x400 - (read_addr % 0x400))
-            first_read_size = min(first_read_size, read_size)
-            if self.__read_target_memory(read_addr, first_read_size, read_data) is False:
-                return False
-            if first_read_size == read_size:
-                return True
-            read_addr += first_read_size
-            read_size -= first_read_size
-        read_count = read_size // 0x400
-        for _ in range(read_count):
-            if self.__read_target_memory(read_addr, 0x400, read_data) is False:
-                return False
-            read_addr += 0x400
-            read_size -= 0x400
-        if read_size:
-            if self.__read_target_memory(read_addr, read_size, read_data) is False:
-                return False
+        # 块读取的响应直接拷贝到预先分配好的字节缓冲区，最后整体转换为32位数据
+        data = bytearray(size)
+        if self._stream_target_memory(start_addr, size, memoryview(data), False) is False:
+            return False
+
+        if isinstance(read_data, list):
+            read_data.extend(self._bytes_to_uint32_array(data))
+        else:
+            read_data.extend(data)
         return True
 
-    def _write_target_memory(self, start_addr, size, write_data: list) -> bool:
-        write_addr = start_addr
-        write_size = size
-        if write_addr % 4 != 0 or write_size % 4 != 0:
+    def _bytes_to_uint32_array(self, data) -> array.array:
+        """
+        将小端序字节数据整体转换为32位无符号整数数组
+        :param data: 字节数据，长度为4的整数倍
+        :return: array('I')
+        """
+        words = array.array('I')
+        words.frombytes(data)
+        if sys.byteorder != 'little':
+            words.byteswap()
+        return words
+
+    def _write_target_memory(self, start_addr, size, write_data: Union[list, bytes, bytearray, memoryview]) -> bool:
+        """
+        :param write_data: 32位整数列表，或任意支持缓冲区协议的对象（按小端序字节写入）
+        """
+        if start_addr % 4 != 0 or size % 4 != 0:
             logging.error("Write address and size must be 4-byte aligned.")
             return False
-        if write_addr % 0x400 != 0:
-            """
-            如果写入地址不是0x400的整数倍，则先写入到下一个0x400对齐地址的数据
-            """
-            first_write_size = (0x400 - (write_addr % 0x400))
-            first_write_size = min(first_write_size, write_size)
-            if self.__write_target_memory(write_addr, first_write_size, write_data[0:first_write_size//4]) is False:
-                return False
-            if first_write_size == write_size:
-                return True
-            write_addr += first_write_size
-            write_size -= first_write_size
-            write_data = write_data[first_write_size//4:]
-        write_count = write_size // 0x400
-        for _ in range(write_count):
-            if self.__write_target_memory(write_addr, 0x400, write_data[0:0x400//4]) is False:
-                return False
-            write_addr += 0x400
-            write_size -= 0x400
-            write_data = write_data[0x400//4:]
-        if write_size:
-            if self.__write_target_memory(write_addr, write_size, write_data[0:write_size//4]) is False:
-                return False
+        write_view = self._to_byte_view(write_data)
+        if len(write_view) < size:
+            logging.error("Write data is shorter than write size.")
+            return False
+        if self._stream_target_memory(start_addr, size, write_view[:size], True) is False:
+            return False
 
         if self._check_dp_ctrl_stat_error() is False:
             return False
 
         return True
 
-    def __read_target_memory(self, start_addr, size, read_data: list) -> bool:
-            packet_size = self.dap_packet_size - 4
-            packet_size = ((packet_size - (packet_size % 4)) & 0xFFFF) // 4 # 以4字节为单位
-            size_words = size // 4
-            packet_transfer_count = size_words // packet_size
-            read_buffer = usb.util.create_buffer(self.dap_packet_size)
-            if self._set_rw_address(start_addr) is False:
-                    return False
-            for _ in range(packet_transfer_count // self.dap_packet_count):
-                for _ in range(self.dap_packet_count):
-                    if self._dap_transfer_block_write(0x00, packet_size, 0x0F) is False:
-                        return False
-                for _ in range(self.dap_packet_count):
-                    read_len = self._dap_transfer_block_read(read_buffer)
-                    if read_len is None or read_len == 0:
-                        return False
-                    response = self._check_dap_transfer_block_response(read_buffer[1:read_len])
-                    if response != self.TRANSFER_RESPONSE['OK']:
-                        return False
-                    for index in range(4, read_len, 4):
-                        data32 = self._response_list_to_uint32_t(read_buffer[index:index+4])
-                        read_data.append(data32)
-            rest_packet_transfer_count = packet_transfer_count % self.dap_packet_count
-            if rest_packet_transfer_count:
-                for _ in range(rest_packet_transfer_count):
-                    if self._dap_transfer_block_write(0x00, packet_size, 0x0F) is False:
-                        return False
-                for _ in range(rest_packet_transfer_count):
-                    read_len = self._dap_transfer_block_read(read_buffer)
-                    if read_len is None or read_len == 0:
-                        return False
-                    response = self._check_dap_transfer_block_response(read_buffer[1:read_len])
-                    if response != self.TRANSFER_RESPONSE['OK']:
-                        return False
-                    for index in range(4, read_len, 4):
-                        data32 = self._response_list_to_uint32_t(read_buffer[index:index+4])
-                        read_data.append(data32)
-            rest_words = size_words % packet_size
-            if rest_words:
-                if self._dap_transfer_block_write(0x00, rest_words, 0x0F) is False:
-                    return False
-                read_len = self._dap_transfer_block_read(read_buffer)
-                if read_len is None or read_len == 0:
-                    return False
-                response = self._check_dap_transfer_block_response(read_buffer[1:read_len])
-                if response != self.TRANSFER_RESPONSE['OK']:
-                    return False
-                for index in range(4, read_len, 4):
-                    data32 = self._response_list_to_uint32_t(read_buffer[index:index+4])
-                    read_data.append(data32)
-            return True
+    def _to_byte_view(self, data) -> memoryview:
+        """
+        将写入数据统一转换为字节视图
+        :param data: 32位整数列表，或任意支持缓冲区协议的对象；元素为32位的视图（array('I')、
+                     memoryview.cast('I')、ctypes数组）按主机字节序的字处理，其他按字节处理
+        :return: memoryview（格式为'B'），字节序为目标的小端序
+        """
+        if isinstance(data, list):
+            data = array.array('I', data)
+        view = memoryview(data)
+        if view.itemsize == 4 and sys.byteorder != 'little':
+            words = array.array('I')
+            words.frombytes(view.cast('B'))
+            words.byteswap()
+            view = memoryview(words)
+        return view.cast('B')
 
-    def __write_target_memory(self, start_addr, size, write_data: list) -> bool:
-        packet_size = self.dap_packet_size - 5
+    def _iter_stream_commands(self, start_addr, size, is_write):
+        """
+        按TAR自动递增的0x400边界拆分一段连续内存的传输
+        每个0x400窗口先生成一条设置TAR的命令，再生成若干条块传输命令
+        :return: 生成器，元素为(是否为TAR命令, TAR地址或数据偏移, 传输字数)
+        """
+        packet_size = self.dap_packet_size - (5 if is_write else 4)
         packet_size = ((packet_size - (packet_size % 4)) & 0xFFFF) // 4 # 以4字节为单位
-        size_words = size // 4
-        packet_transfer_count = size_words // packet_size
-        buffer = usb.util.create_buffer(self.dap_packet_size)
-        if self._set_rw_address(start_addr) is False:
-            return False
-        start_index = 0
-        end_index = 0
-        for _ in range(packet_transfer_count // self.dap_packet_count):
-            for _ in range(self.dap_packet_count):
-                end_index = start_index + packet_size
-                if self._dap_transfer_block_write(0x00, packet_size, 0x0D, write_data[start_index:end_index]) is False:
-                    return False
-                start_index += packet_size
-            for _ in range(self.dap_packet_count):
-                read_len = self._dap_transfer_block_read(buffer)
-                if read_len is None or read_len == 0:
-                    return False
-                if self._check_dap_transfer_block_response(buffer[1:read_len]) != self.TRANSFER_RESPONSE['OK']:
-                    return False
-        rest_packet_transfer_count = packet_transfer_count % self.dap_packet_count
-        if rest_packet_transfer_count:
-            for _ in range(rest_packet_transfer_count):
-                end_index = start_index + packet_size
-                if self._dap_transfer_block_write(0x00, packet_size, 0x0D, write_data[start_index:end_index]) is False:
-                    return False
-                start_index += packet_size
-            for _ in range(rest_packet_transfer_count):
-                read_len = self._dap_transfer_block_read(buffer)
-                if read_len is None or read_len == 0:
-                    return False
-                if self._check_dap_transfer_block_response(buffer[1:read_len]) != self.TRANSFER_RESPONSE['OK']:
-                    return False
-        rest_words = size_words % packet_size
-        if rest_words:
-            if self._dap_transfer_block_write(0x00, rest_words, 0x0D, write_data[start_index:start_index+rest_words]) is False:
-                return False
-            read_len = self._dap_transfer_block_read(buffer)
-            if read_len is None or read_len == 0:
-                return False
-            if self._check_dap_transfer_block_response(buffer[1:read_len]) != self.TRANSFER_RESPONSE['OK']:
+        addr = start_addr
+        offset = 0
+        while offset < size:
+            window_size = min(0x400 - (addr % 0x400), size - offset)
+            yield True, addr, 1
+            window_end = offset + window_size
+            while offset < window_end:
+                words = min(packet_size, (window_end - offset) // 4)
+                yield False, offset, words
+                offset += words * 4
+            addr += window_size
+
+    def _stream_target_memory(self, start_addr, size, data_view: memoryview, is_write: bool) -> bool:
+        """
+        以流水线方式读写一段连续内存
+        下一个0x400窗口的TAR设置命令与块传输命令排在同一个命令队列中，
+        探针中始终保持最多dap_packet_count个未处理的命令包，窗口边界处不再等待队列排空
+        :param data_view: 读取时为存放数据的字节缓冲区，写入时为要写入的字节数据，大小均等于size
+        :param is_write: True为写入，False为读取
+        """
+        for is_tar, value, words in self._iter_stream_commands(start_addr, size, is_write):
+            if is_tar:
+                command = self._pack_transfer_command(0x00, 0x01, [[0x05, value]])
+                result = self._submit_command(command, self._on_set_rw_address_response, value)
+            elif is_write:
+                command = self._pack_transfer_block_command(0x00, words, 0x0D, data_view[value:value + words * 4])
+                result = self._submit_command(command, self._on_memory_block_response, start_addr + value, words, None)
+            else:
+                command = self._pack_transfer_block_command(0x00, words, 0x0F)
+                result = self._submit_command(command, self._on_memory_block_response, start_addr + value, words,
+                                              data_view[value:value + words * 4])
+            if result is False:
                 return False
+        return self._flush_commands()
+
+    def _on_set_rw_address_response(self, response: memoryview, read_len, addr) -> bool:
+        """
+        设置TAR地址命令的响应回调
+        """
+        result = self._check_dap_transfer_response(response[0:3])
+        if result == self.TRANSFER_RESPONSE['NO_ACK']:
+            logging.warning("Set read/write address no ack")
+        elif result != self.TRANSFER_RESPONSE['OK']:
+            logging.error(f"Failed to set read/write address, address: 0x{addr:08X}.")
+            return False
         return True
 
-    def get_xor_value(self, data, length) -> int:
-        xor_value = 0
-        for i in range(length):
-            xor_value ^= data[i]
-        return xor_value
+    def _on_memory_block_response(self, response: memoryview, read_len, addr, words, read_view) -> bool:
+        """
+        内存块传输命令的响应回调
+        :param read_view: 读取时存放数据的字节缓冲区，写入时为None
+        """
+        if response[0] != 0x06 or read_len < 4 or (response[1] | response[2] << 8) != words:
+            logging.error(f"Memory block transfer incomplete, address: 0x{addr:08X}.")
+            return False
+        if self._check_dap_transfer_block_response(response[1:4]) != self.TRANSFER_RESPONSE['OK']:
+            logging.error(f"Memory block transfer failed, response: 0x{response[3]:02X}.")
+            return False
+        if read_view is not None:
+            if read_len < words * 4 + 4:
+                logging.error("Memory block read response is too short.")
+                return False
+            read_view[:] = response[4:4 + words * 4]
+        return True
 
     def _read_target_id(self) -> bool:
+        if self.session.connected:
+            return True
+
         if self._steup_swj_sequence(self.dap_swj_clock) is False:
             return False
 
@@ -426,6 +600,7 @@ class DAPHandler:
         self.cpu_id = 'Unknown'
         self.cpu_id = f"0x{cpu_id:08X}"
 
+        self.session.connected = self.session.active
         return True
 
     def _reset_and_halt_target(self) -> bool:
@@ -458,44 +633,57 @@ class DAPHandler:
         return True
 
     def _steup_swj_sequence(self, swj_clock=5000000) -> bool:
-        self._get_dap_vid_pid()
-        self._get_dap_firmware_version()
-        if self.firmware_version == 'Unknown':
-            logging.error("Failed to get DAP firmware version.")
-            return False
-
+        # 先读取能力和包大小，决定后续命令能否打包执行
         self._get_dap_capabilities()
         if self.dap_caps == 0x00:
             logging.error("Failed to get DAP capabilities.")
             return False
 
-        self._get_dap_packet_size()
+        if self._get_dap_info() is False:
+            return False
+        if self.firmware_version == 'Unknown':
+            logging.error("Failed to get DAP firmware version.")
+            return False
+
         if self.dap_packet_size == 0:
             logging.error("Failed to get DAP packet size.")
             return False
 
-        self._get_dap_packet_count()
         if self.dap_packet_count == 0:
             logging.error("Failed to get DAP packet count.")
             return False
 
-        if self._connect_dap_device(0) == 0:
+        if swj_clock == 0:
+            swj_clock = self.dap_swj_clock
+        commands = [
+            self.CONNECT_COMMANDS['default'],
+            self._swj_clock_command(swj_clock),  # 设置SWJ时钟频率
+            self._transfer_configure_command(0x00, (0xFF & 0xFFFF), self._get_match_retry(swj_clock)),  # 配置传输参数
+            self._swd_configure_command(0x00),  # 配置SWD协议参数
+            self.HOST_STATUS_COMMANDS['connect_on'],
+        ]
+        responses = self._execute_command_batch(commands, [2] * len(commands))
+        if responses is False:
+            logging.error("Failed to connect to DAP device.")
+            return False
+
+        if responses[0][1] == 0:
             logging.error("Failed to connect to DAP device.")
             return False
 
-        if self._set_dap_swj_clock(swj_clock) is False:  # 设置SWJ时钟频率
+        if responses[1][1] != self.DAP_STATUS['OK']:
             logging.error("Failed to set SWJ clock frequency.")
             return False
 
-        if self._config_dap_transfer(0x00, (0xFF & 0xFFFF), (0xFF & 0xFFFF)) is False:  # 配置传输参数
+        if responses[2][1] != self.DAP_STATUS['OK']:
             logging.error("Failed to configure DAP transfer parameters.")
             return False
 
-        if self._config_dap_swd(0x00) is False:  # 配置SWD协议参数
+        if responses[3][1] != self.DAP_STATUS['OK']:
             logging.error("Failed to configure SWD protocol parameters.")
             return False
 
-        if self._set_dap_host_status('connect_on') is False:
+        if responses[4][1] != self.DAP_STATUS['OK']:
             logging.error("Failed to set host status(connect on).")
             return False
 
@@ -505,6 +693,10 @@ class DAPHandler:
         return True
 
     def _stop_dap_device(self) -> bool:
+        if self.session.active:
+            # 会话期间保持连接，由close_session断开
+            return True
+
         if self._set_dap_host_status('connect_off') is False:
             return False
 
@@ -513,39 +705,33 @@ class DAPHandler:
         return True
 
     def _read_debug_id(self):
-        if self._send_swd_start_sequence() is False:
-            return False
-
-        response = []
-        if self._dap_transfer(0x00, 0x01, [[0x02, []]], response) is False:
+        # SWD开始序列和读DPIDR一起发送
+        read_dpidr = self._transfer_command(0x00, 0x01, [[0x02, []]])
+        commands = self._swd_start_sequence_commands() + [read_dpidr]
+        responses = self._execute_command_batch(commands, [2] * (len(commands) - 1) + [7])
+        if responses is False:
             return False
+        response = responses[-1]
 
         # 第一个开始序列不行，使用dormant状态转换
         if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
-            if self._send_swj_reset_sequence() is False:
-                return False
-
-            if self._send_swj_swd_to_dormant_sequence() is False:
-                return False
-
-            if self._send_swj_reset_sequence() is False:
-                return False
-
-            if self._send_swj_jtag_to_dormant_sequence() is False:
-                return False
-
-            if self._send_swj_dormant_to_swd_sequence() is False:
-                return False
-
-            if self._send_swj_reset_sequence() is False:
-                return False
-
-            if self._send_swj_idle_sequence() is False:
-                return False
-
-            response.clear()
-            if self._dap_transfer(0x00, 0x01, [[0x02, []]], response) is False:
+            commands = [
+                self._swj_sequence_command(*self.SWJ_SEQUENCES['reset']),
+                self._swj_sequence_command(*self.SWJ_SEQUENCES['swd_to_dormant']),
+                self._swj_sequence_command(*self.SWJ_SEQUENCES['reset']),
+                self._swj_sequence_command(*self.SWJ_SEQUENCES['jtag_to_dormant']),
+                self._swj_sequence_command(*self.SWJ_SEQUENCES['dormant_to_swd']),
+                self._swj_sequence_command(*self.SWJ_SEQUENCES['reset']),
+                self._swj_sequence_command(*self.SWJ_SEQUENCES['idle']),
+                read_dpidr,
+            ]
+            responses = self._execute_command_batch(commands, [2] * (len(commands) - 1) + [7])
+            if responses is False:
                 return False
+            for sequence_response in responses[:-1]:
+                if sequence_response[1] != self.DAP_STATUS['OK']:
+                    return False
+            response = responses[-1]
 
             if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
                 return False
@@ -558,10 +744,14 @@ class DAPHandler:
     def _get_coresight_component_table(self):
         # 清除coresight_rom_table的每一项
         self._coresight_component_table = ROM_TABLE().get_component_table()
-        for index, key in enumerate(self._coresight_component_table):
-            if index == 0:
-                continue
-            temp = self._read_reg(self._coresight_component_table['BASE_ADDR'] + (index-1) * 4)
+        # 所有表项的读取命令一次性排入命令队列，再按顺序处理结果
+        entries = []
+        for index in range(1, len(self._coresight_component_table)):
+            if self._submit_read_reg(self._coresight_component_table['BASE_ADDR'] + (index-1) * 4, entries) is False:
+                return False
+        if self._flush_commands() is False:
+            return False
+        for key, temp in zip(list(self._coresight_component_table)[1:], entries):
             if temp & 0x01 != 0:
                 self._coresight_component_table[key] = \
                     ((temp & 0xFFFFFFFC) + self._coresight_component_table['BASE_ADDR']) & 0xFFFFFFFC
@@ -689,20 +879,6 @@ class DAPHandler:
 
         return True
 
-    def _set_rw_address(self, addr) -> bool:
-        response = []
-        if self._dap_transfer(0x00, 0x01, [[0x05, addr]], response) is False:
-            logging.error(f"Failed to set read/write address, address: 0x{addr:08X}.")
-            return False
-
-        if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
-            if self._check_dap_transfer_response(response) == self.TRANSFER_RESPONSE['NO_ACK']:
-                logging.warning("Set read/write address no ack")
-            else:
-                logging.error(f"Failed to set read/write address, response: 0x{response[2]:02X}")
-                return False
-        return True
-
     def _write_reg(self, reg_address, value) -> bool:
         """
         写寄存器
@@ -744,6 +920,16 @@ class DAPHandler:
 
         return self._response_list_to_uint32_t(response[3:7])
 
+    def _submit_read_reg(self, reg_address, values: list) -> bool:
+        """
+        将读寄存器命令排入命令队列，不等待响应
+        :param reg_address: 寄存器地址
+        :param values: 响应到达后寄存器值追加到该列表
+        :return: 命令是否成功排入队列
+        """
+        command = self._pack_transfer_command(0x00, 0x02, [[0x05, reg_address], [0x0F, []]])
+        return self._submit_command(command, self._on_transfer_response, 0x02, values, 1)
+
     def _response_list_to_uint32_t(self, response):
         """
         将DAP响应列表转换为32位无符号整数
@@ -763,139 +949,166 @@ class DAPHandler:
         0x13: 以掩码读DHCSR寄存器
         0x0B: 读DCRDR寄存器
         """
-        self._execute_operation_init()
-        response = []
-        # 先写R0-R3寄存器
-        data = [
-            [0x09, operation.r0],
-            [0x05, 0x00010000],
-            [0x13, 0x00010000],
-            [0x09, operation.r1],
-            [0x05, 0x00010001],
-            [0x13, 0x00010000],
-            [0x09, operation.r2],
-            [0x05, 0x00010002],
-            [0x13, 0x00010000],
-            [0x09, operation.r3],
-            [0x05, 0x00010003],
-            [0x13, 0x00010000],
-        ]
-        if self._dap_transfer(0x00, 0x0C, data, response) is False:
-            logging.error("Failed to write excute operation.")
+        if self._start_execute_operation(operation) is False:
             return False
+        return self._wait_execute_operation(operation.timeout)
 
-        if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
-            logging.error(f"Failed to write excute operation, response: 0x{response[2]:02X}")
-            return False
-        # 然后写R9, R13, R14, R15寄存器
-        response.clear()
-        data = [
-            [0x09, operation.r9],
-            [0x05, 0x00010009],
-            [0x13, 0x00010000],
-            [0x09, operation.r13],
-            [0x05, 0x0001000D],
-            [0x13, 0x00010000],
-            [0x09, operation.r14],
-            [0x05, 0x0001000E],
-            [0x13, 0x00010000],
-            [0x09, operation.r15],
-            [0x05, 0x0001000F],
-            [0x13, 0x00010000],
-        ]
-        if self._dap_transfer(0x00, 0x0C, data, response) is False:
-            logging.error("Failed to write excute operation.")
-            return False
+    def _start_execute_operation(self, operation: ExecuteOperation) -> bool:
+        """
+        写入内核寄存器并启动运行，不等待运行结束
+        寄存器写入和启动运行的命令包按模板缓存，每次调用只改写R0-R3；
+        寄存器写入的命令包通过命令队列连续发出，全部成功后才单独发送启动运行的命令包
+        """
+        setup_packets, run_packet = self._get_execute_operation_packets(operation)
+        registers = (operation.r0, operation.r1, operation.r2, operation.r3)
+        for packet, _, patches in setup_packets:
+            for register_index, offset in patches:
+                struct.pack_into('<I', packet, offset, registers[register_index] & 0xFFFFFFFF)
 
-        if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
-            logging.error(f"Failed to write excute operation, response: 0x{response[2]:02X}")
-            return False
-        # 最后写xpsr, DHCSR寄存器，并读取DP端口的DP-CTRL/STAT寄存器
-        response.clear()
-        data = [
-            [0x09, operation.xpsr],
-            [0x05, 0x00010010],
-            [0x13, 0x00010000],
-            [0x01, 0xA05F0001],
-            [0x06, []],
-        ]
-        if self._dap_transfer(0x00, 0x05, data, response) is False:
-            logging.error("Failed to write excute operation.")
-            return False
+        for packet, transfer_count, _ in setup_packets:
+            if self._submit_command(packet, self._on_transfer_response, transfer_count) is False:
+                return self._cancel_execute_operation()
+        if self._flush_commands() is False:
+            return self._cancel_execute_operation()
 
-        if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
-            logging.error(f"Failed to write excute operation, response: 0x{response[2]:02X}")
-            return False
-        dp_status = self._response_list_to_uint32_t(response[3:7])
-        if (dp_status & 0x00000080) != 0 or (dp_status & 0x00000040) == 0:
-            logging.error(f"DP status read/write error(code: 0x{dp_status:08X})")
-            return False
-        self._write_dp_select(0x00000000)
-        timeout = operation.timeout
-        while True:
-            timeout -=10 # 10ms
-            if timeout <= 0:
-                logging.error("Execute operation timeout.")
-                return False
-            dhcsr_value = self._read_reg(DEBUG_REG.DHCSR)
-            if dhcsr_value is False:
-                return False
-            if (dhcsr_value & 0x00030000) == 0x00030000:
-                break
-            time.sleep(0.01)
-        # 读取返回值
-        self._execute_operation_init()
-        response.clear()
-        data = [
-            [0x05, 0x00000000],
-            [0x13, 0x00010000],
-            [0x0B, []],
-            [0x06, []],
-        ]
-        if self._dap_transfer(0x00, 0x04, data, response) is False:
+        # 启动运行的命令包以读DP-CTRL/STAT寄存器结束
+        values = []
+        packet, transfer_count, _ = run_packet
+        if self._submit_command(packet, self._on_transfer_response, transfer_count, values, 1) is False or \
+            self._flush_commands() is False:
             logging.error("Failed to write excute operation.")
             return False
 
-        if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
-            logging.error(f"Failed to write excute operation, response: 0x{response[2]:02X}")
-            return False
-
-        dp_status = self._response_list_to_uint32_t(response[7:11])
+        dp_status = values[0]
         if (dp_status & 0x00000080) != 0 or (dp_status & 0x00000040) == 0:
             logging.error(f"DP status read/write error(code: 0x{dp_status:08X})")
             return False
+        return True
+
+    def _cancel_execute_operation(self) -> bool:
+        """
+        寄存器未全部写入时不启动运行，内核保持停机，恢复AP寄存器组0
+        :return: False
+        """
+        logging.error("Failed to write excute operation.")
         self._write_dp_select(0x00000000)
-        timeout = operation.timeout
-        while True:
-            timeout -=1 # 1ms
-            if timeout <= 0:
-                logging.error("Execute operation timeout.")
-                return False
-            dhcsr_value = self._read_reg(DEBUG_REG.DHCSR)
-            if dhcsr_value is False:
-                return False
-            elif (dhcsr_value & 0x00030000) == 0x00030000:
-                break
-            time.sleep(0.001)
+        return False
 
-        ret = self._response_list_to_uint32_t(response[3:7])
-        return ret
+    def _get_execute_operation_packets(self, operation: ExecuteOperation):
+        """
+        获取写入内核寄存器并启动运行的命令包
+        除R0-R3外的寄存器值相同的调用共用一组命令包，寄存器写入按dap_packet_size尽量少地拆分，
+        启动运行单独一个命令包，保证寄存器写入全部成功后才启动
+        :return: ([(命令包, 传输数量, [(R0-R3的序号, 数据在命令包中的偏移)]), ...], 启动运行的命令包)
+        """
+        key = (operation.r9, operation.r13, operation.r14, operation.r15, operation.xpsr, self.dap_packet_size)
+        packets = self._execute_operation_packets.get(key)
+        if packets is not None:
+            return packets
 
-    def _execute_operation_init(self):
-        response = []
-        data = [
+        # 选择DHCSR所在的寄存器组，BD0-BD3对应DHCSR、DCRSR、DCRDR、DEMCR
+        transfers = [
             [0x20, 0x00010000],
             [0x08, 0x00000000],
             [0x05, DEBUG_REG.DHCSR],
             [0x08, 0x00000010],
         ]
-        if self._dap_transfer(0x00, 0x04, data, response) is False:
-            logging.error("Failed to read register, address: {reg_address}.")
-            return False
+        patch_transfers = {}
+        for register, value in ((0, None), (1, None), (2, None), (3, None), (9, operation.r9), (13, operation.r13),
+                                (14, operation.r14), (15, operation.r15), (16, operation.xpsr)):
+            if value is None:
+                patch_transfers[len(transfers)] = register
+                value = 0
+            transfers.append([0x09, value])                     # 写DCRDR
+            transfers.append([0x05, 0x00010000 | register])     # 写DCRSR
+            transfers.append([0x13, 0x00010000])                # 等待S_REGRDY
+        # 写DHCSR启动运行，恢复AP寄存器组0（运行期间可以继续读写内存），并读取DP-CTRL/STAT寄存器
+        run_transfers = [
+            [0x01, 0xA05F0001],
+            [0x08, 0x00000000],
+            [0x06, []],
+        ]
+        run_packet = (bytearray(self._transfer_command(0x00, len(run_transfers), run_transfers)), len(run_transfers), [])
+
+        packets = []
+        index = 0
+        while index < len(transfers):
+            chunk = []
+            patches = []
+            size = 3
+            while index < len(transfers) and len(chunk) < 0xFF:
+                transfer_size = 1 if (transfers[index][0] & 0x02) and not (transfers[index][0] & 0x10) else 5
+                if size + transfer_size > self.dap_packet_size:
+                    break
+                if index in patch_transfers:
+                    patches.append((patch_transfers[index], size + 1))
+                chunk.append(transfers[index])
+                size += transfer_size
+                index += 1
+            packets.append((bytearray(self._transfer_command(0x00, len(chunk), chunk)), len(chunk), patches))
+
+        if len(self._execute_operation_packets) >= 16:
+            self._execute_operation_packets.clear()
+        self._execute_operation_packets[key] = (packets, run_packet)
+        return packets, run_packet
+
+    def _wait_execute_operation(self, timeout_ms):
+        """
+        等待内核停机并读取返回值R0，结束后DP SELECT恢复为0
+        一个命令包内完成：值匹配读DHCSR等待S_HALT和S_REGRDY，读R0，读DP-CTRL/STAT。
+        探针内每条值匹配命令最多重试match_retry次，未匹配或响应读取超时时重新发送命令，
+        Python侧只按timeout_ms做粗粒度的超时判断
+        :param timeout_ms: 超时时间（毫秒）
+        :return: R0的值，失败时返回False
+        """
+        deadline = time.monotonic() + timeout_ms / 1000
+        data = [
+            [0x08, 0x00000000],     # 选择AP寄存器组0
+            [0x05, DEBUG_REG.DHCSR],  # TAR指向DHCSR
+            [0x08, 0x00000010],     # 选择AP寄存器组1，BD0对应DHCSR
+            [0x20, 0x00030000],     # 匹配掩码：S_HALT和S_REGRDY
+            [0x13, 0x00030000],     # 值匹配读DHCSR，等待停机
+            [0x20, 0x00010000],     # 匹配掩码：S_REGRDY
+            [0x05, 0x00000000],     # 写DCRSR，读取R0
+            [0x13, 0x00010000],     # 等待S_REGRDY
+            [0x0B, []],             # 读DCRDR
+            [0x06, []],             # 读DP-CTRL/STAT寄存器
+            [0x08, 0x00000000],     # 恢复AP寄存器组0
+        ]
+        response = []
+        while True:
+            if self._dap_transfer(0x00, len(data), data, response) is False:
+                # 响应读取超时时命令可能仍在探针内重试，中止并读走迟到的响应后重新发送
+                if self._lost_responses and time.monotonic() < deadline and self._abort_transfer():
+                    continue
+                logging.error("Failed to read DHCSR register.")
+                break
+            result = self._check_dap_transfer_response(response)
+            if result == self.TRANSFER_RESPONSE['OK']:
+                dp_status = self._response_list_to_uint32_t(response[7:11])
+                if (dp_status & 0x00000080) != 0 or (dp_status & 0x00000040) == 0:
+                    logging.error(f"DP status read/write error(code: 0x{dp_status:08X})")
+                    return False
+                return self._response_list_to_uint32_t(response[3:7])
+            if result != self.TRANSFER_RESPONSE['Mismatch']:
+                logging.error(f"Failed to read DHCSR register, response: 0x{response[2]:02X}")
+                break
+            if time.monotonic() >= deadline:
+                logging.error("Execute operation timeout.")
+                break
+        # 命令包可能仍在探针中执行，先中止并读走迟到的响应，否则后续命令会错收这条响应
+        self._abort_transfer()
+        self._write_dp_select(0x00000000)
+        return False
 
-        if self._check_dap_transfer_response(response) != self.TRANSFER_RESPONSE['OK']:
-            logging.error(f"Failed to read register, response: 0x{response[2]:02X}")
-            return False
+    def _get_match_retry(self, swj_clock) -> int:
+        """
+        根据SWJ时钟计算值匹配的重试次数，保证一条值匹配命令在探针内的执行时间约为50ms，
+        不超过USB传输的100ms超时；低时钟时允许少于16次
+        每次重试按约100个SWJ时钟周期估算
+        :param swj_clock: SWJ时钟频率（Hz）
+        """
+        return max(1, min(0xFFFF, swj_clock // 2000))
 
     """
     Response Status
@@ -1475,6 +1688,66 @@ class DAPHandler:
 
         return command
 
+    def _get_command_buffer(self, size) -> memoryview:
+        """
+        获取可复用的命令缓冲区，缓冲区大小不小于dap_packet_size
+        :param size: 本次命令需要的字节数
+        :return: 命令缓冲区
+        """
+        size = max(size, self.dap_packet_size)
+        if len(self._command_buffer) < size:
+            self._command_buffer = bytearray(size)
+        return memoryview(self._command_buffer)
+
+    def _pack_transfer_command(self, dap_index, transfer_count, transfer_sequence) -> memoryview:
+        """
+        构建DAP_Transfer命令，参数同_transfer_command
+        命令直接打包到可复用的命令缓冲区中，不再逐字节构建列表
+        :return: 命令数据（在下次打包命令前有效）
+        """
+        buffer = self._get_command_buffer(3 + len(transfer_sequence) * 5)
+        buffer[0] = 0x05
+        buffer[1] = dap_index
+        buffer[2] = transfer_count
+        offset = 3
+        for request_byte, transfer_data in transfer_sequence:
+            buffer[offset] = request_byte
+            offset += 1
+
+            # 对于写操作、值匹配读操作、匹配掩码写操作，需要包含数据
+            rnw = (request_byte >> 1) & 1  # 读写位
+            value_match = (request_byte >> 4) & 1  # 值匹配位
+            if (rnw == 0 or value_match == 1) and transfer_data is not None:
+                if isinstance(transfer_data, int):
+                    struct.pack_into('<I', buffer, offset, transfer_data & 0xFFFFFFFF)
+                    offset += 4
+                elif len(transfer_data):
+                    buffer[offset:offset + len(transfer_data)] = bytes(transfer_data)
+                    offset += len(transfer_data)
+
+        return buffer[:offset]
+
+    def _pack_transfer_block_command(self, dap_index, transfer_count, transfer_request, transfer_data=None) -> memoryview:
+        """
+        构建DAP_TransferBlock命令，参数同_transfer_block_command
+        命令直接打包到可复用的命令缓冲区中，写数据可以是32位整数列表，也可以是任意支持缓冲区协议的对象（小端序字节数据）
+        :return: 命令数据（在下次打包命令前有效）
+        """
+        rnw = (transfer_request >> 1) & 1  # 读写位
+        data_size = 0
+        if rnw == 0 and transfer_data is not None:
+            data_size = len(transfer_data) * 4 if isinstance(transfer_data, list) else transfer_count * 4
+
+        buffer = self._get_command_buffer(5 + data_size)
+        struct.pack_into('<BBHB', buffer, 0, 0x06, dap_index, transfer_count, transfer_request)
+        if data_size:
+            if isinstance(transfer_data, list):
+                struct.pack_into(f'<{len(transfer_data)}I', buffer, 5, *transfer_data)
+            else:
+                buffer[5:5 + data_size] = memoryview(transfer_data).cast('B')[:data_size]
+
+        return buffer[:5 + data_size]
+
     # DAP_TransferAbort命令定义
     # 响应格式: 无响应
     # 功能: 中止当前传输。可以在DAP_Transfer或DAP_TransferBlock命令仍在进行时执行。
@@ -1541,14 +1814,108 @@ class DAPHandler:
 
         return command
 
-    def _get_dap_vid_pid(self):
-        buffer = usb.util.create_buffer(512)
-        self.usb_device_handle.send_data_to_dap_device(self.INFO_COMMANDS['vid'], timeout=100)
-        self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
-        self.usb_device_handle.send_data_to_dap_device(self.INFO_COMMANDS['pid'], timeout=100)
-        self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
-        self.usb_device_handle.send_data_to_dap_device(self.INFO_COMMANDS['sn'], timeout=100)
-        self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
+    def _execute_command_batch(self, commands, response_lengths):
+        """
+        批量执行多条DAP命令
+        探针支持原子命令时，按数据包大小把多条命令打包进DAP_ExecuteCommands，一次USB往返执行多条命令；
+        否则逐条发送，命令通过命令队列连续发出，不再逐条等待响应。
+        DAP_QueueCommands的响应要等到下一个非排队数据包才返回，在已有命令队列的基础上没有额外收益，这里不使用。
+        :param commands: 命令列表，每条命令是一个字节列表
+        :param response_lengths: 每条命令的响应长度，None表示DAP_Info这类由响应第二个字节给出长度的命令
+                                 DAP_Transfer只能作为最后一条命令，失败时响应只有3个字节
+        :return: 每条命令的响应（字节列表）组成的列表，失败时返回False
+        """
+        responses = []
+        if self.dap_caps & 0x10:
+            batch = []
+            command_size = 2
+            response_size = 2
+            for command, response_length in zip(commands, response_lengths):
+                # DAP_Info字符串信息的长度未知，按最长32字节估算
+                estimate_length = response_length if response_length is not None else 34
+                if batch and (command_size + len(command) > self.dap_packet_size or
+                              response_size + estimate_length > self.dap_packet_size or len(batch) == 0xFF):
+                    if self._submit_command_batch(batch, responses) is False:
+                        return False
+                    batch = []
+                    command_size = 2
+                    response_size = 2
+                batch.append((command, response_length))
+                command_size += len(command)
+                response_size += estimate_length
+            if batch and self._submit_command_batch(batch, responses) is False:
+                return False
+        else:
+            for command, response_length in zip(commands, response_lengths):
+                if self._submit_command(command, self._on_batch_response, [(command, response_length)], responses, 0) is False:
+                    return False
+        if self._flush_commands() is False:
+            return False
+        return responses
+
+    def _submit_command_batch(self, batch, responses: list) -> bool:
+        """
+        将一组命令打包为DAP_ExecuteCommands排入命令队列
+        :param batch: (命令, 响应长度)列表
+        """
+        command = self._execute_commands_command([command for command, _ in batch])
+        if len(command) > self.dap_packet_size:
+            logging.error("DAP command batch exceeds packet size.")
+            return False
+        return self._submit_command(command, self._on_batch_response, batch, responses, 2)
+
+    def _on_batch_response(self, response: memoryview, read_len, batch, responses: list, offset) -> bool:
+        """
+        批量命令的响应回调，按命令拆分响应并追加到responses
+        :param offset: 第一条命令响应的偏移，DAP_ExecuteCommands为2，单条命令为0
+        """
+        if offset and (response[0] != 0x7F or response[1] != len(batch)):
+            logging.error("DAP command batch execute failed.")
+            return False
+        for command, response_length in batch:
+            if response[offset] != command[0]:
+                logging.error(f"DAP command 0x{command[0]:02X} response mismatch.")
+                return False
+            if response_length is None:
+                response_length = 2 + response[offset + 1]
+            elif command[0] == 0x05 and response[offset + 2] & 0x07 != 0x01:
+                response_length = 3
+            if offset + response_length > read_len:
+                logging.error(f"DAP command 0x{command[0]:02X} response is too short.")
+                return False
+            responses.append(list(response[offset:offset + response_length]))
+            offset += response_length
+        return True
+
+    def _get_dap_info(self) -> bool:
+        """
+        读取固件版本、最大包大小和最大包数量
+        支持原子命令时一次USB往返读取
+        """
+        if not self.dap_caps & 0x10:
+            self._get_dap_firmware_version()
+            self._get_dap_packet_size()
+            self._get_dap_packet_count()
+            return True
+
+        commands = [
+            self.INFO_COMMANDS['packet_size'],
+            self.INFO_COMMANDS['packet_count'],
+            self.INFO_COMMANDS['version'],
+        ]
+        responses = self._execute_command_batch(commands, [4, 3, None])
+        if responses is False:
+            return False
+        self.dap_packet_size = 0
+        for i in range(responses[0][1]):
+            self.dap_packet_size |= responses[0][i+2] << (i*8)
+        self.dap_packet_count = 0
+        for i in range(responses[1][1]):
+            self.dap_packet_count |= responses[1][i+2] << (i*8)
+        self.firmware_version = 'Unknown'
+        if responses[2][1]:
+            self.firmware_version = ''.join(chr(c) for c in responses[2][2:responses[2][1]])
+        return True
 
     def _get_dap_firmware_version(self):
         write_len = self.usb_device_handle.send_data_to_dap_device(self.INFO_COMMANDS['version'], timeout=100)
@@ -1625,27 +1992,6 @@ class DAPHandler:
             self.dap_packet_count |= buffer[i+2] << (i*8)
         return self.dap_packet_count
 
-    def _connect_dap_device(self, port=0) -> int:
-        """
-        连接到DAP设备
-        :param port: 连接端口 (0=默认, 1=SWD, 2=JTAG)
-        """
-        command = self.CONNECT_COMMANDS.get('swd' if port == 1 else 'jtag' if port == 2 else 'default', None)
-        if command is None:
-            logging.error(f"Invalid port: {port}. Valid ports are: 0 (default), 1 (SWD), 2 (JTAG).")
-            return False
-
-        write_len = self.usb_device_handle.send_data_to_dap_device(command, timeout=100)
-        if write_len != len(command):
-            return False
-
-        buffer = usb.util.create_buffer(self.dap_packet_size)
-        read_len = self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
-        if read_len is None or read_len == 0:
-            return False
-
-        return buffer[1] & 0xFF
-
     def _disconnect_dap_device(self) -> bool:
         """
         断开DAP设备连接
@@ -1662,64 +2008,6 @@ class DAPHandler:
 
         return buffer[1] == self.DAP_STATUS['OK']
 
-    def _set_dap_swj_clock(self, clock_hz=0) -> bool:
-        """
-        设置DAP设备的时钟频率
-        :param clock_hz: 时钟频率 (Hz)
-        """
-        if clock_hz == 0:
-            clock_hz = self.dap_swj_clock
-
-        command = self._swj_clock_command(clock_hz)
-        write_len = self.usb_device_handle.send_data_to_dap_device(command, timeout=100)
-        if write_len != len(command):
-            return False
-
-        buffer = usb.util.create_buffer(self.dap_packet_size)
-        read_len = self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
-        if read_len is None or read_len == 0:
-            return False
-
-        return buffer[1] == self.DAP_STATUS['OK']
-
-    def _config_dap_transfer(self, idle_cycles=0, wait_retry=0xFF, match_retry=0) -> bool:
-        """
-        配置DAP传输参数
-        :param idle_cycles: 每次传输后的额外空闲周期数
-        :param wait_retry: WAIT响应后的传输重试次数
-        :param match_retry: DAP_Transfer中值匹配时的重试次数
-        """
-        command = self._transfer_configure_command(idle_cycles, wait_retry, match_retry)
-        write_len = self.usb_device_handle.send_data_to_dap_device(command, timeout=100)
-        if write_len != len(command):
-            return False
-
-        buffer = usb.util.create_buffer(self.dap_packet_size)
-        read_len = self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
-        if read_len is None or read_len == 0:
-            return False
-
-        return buffer[1] == self.DAP_STATUS['OK']
-
-    def _config_dap_swd(self, configuration=0x00) -> bool:
-        """
-        配置DAP SWD协议参数
-        :param configuration: SWD协议配置字节
-                              Bit 1..0: Turnaround时钟周期 (0=1周期, 1=2周期, 2=3周期, 3=4周期)
-                              Bit 2: DataPhase (0=不在WAIT/FAULT时生成, 1=总是生成)
-        """
-        command = self._swd_configure_command(configuration)
-        write_len = self.usb_device_handle.send_data_to_dap_device(command, timeout=100)
-        if write_len != len(command):
-            return False
-
-        buffer = usb.util.create_buffer(self.dap_packet_size)
-        read_len = self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
-        if read_len is None or read_len == 0:
-            return False
-
-        return buffer[1] == self.DAP_STATUS['OK']
-
     def _set_dap_host_status(self, status) -> bool:
         command = self.HOST_STATUS_COMMANDS.get(status, None)
         if command is None:
@@ -1773,18 +2061,53 @@ class DAPHandler:
 
         return buffer[1] == self.DAP_STATUS['OK']
 
-    def _send_swd_start_sequence(self) -> bool:
-        if self._send_swj_reset_sequence() is False:
-            return False
-        if self._send_swj_switch_swd_sequence() is False:
-            return False
-        if self._send_swj_reset_sequence() is False:
-            return False
-
-        if self._send_swj_idle_sequence() is False:
-            return False
+    """
+    SWJ Sequences
+    格式: (位数, 序列数据)，LSB先传输
+    """
+    SWJ_SEQUENCES = {
+        # 在上电复位后、 DP 从 JTAG 切换到 SWD 后或者线路处于高电平超过 50 个周期后，
+        # SW-DP 状态机处于复位状态。
+        'reset': (0x33, [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]),
+        # 0xE79E
+        'switch_swd': (0x10, [0x9E, 0xE7]),
+        # 在复位状态后线路处于低电平至少两个周期， SW-DP 状态机处于空闲状态。
+        'idle': (0x08, [0x00]),
+        # 至少5个周期高电平 + 0x33BBBBBA
+        'jtag_to_dormant': (0x28, [0xFF, 0xBA, 0xBB, 0xBB, 0x33]),
+        # 0xE3BC
+        'swd_to_dormant': (0x10, [0xBC, 0xE3]),
+        # 至少8个周期高电平 + 128-bit Selection Alert sequence + 4个周期低电平 + activation code sequence
+        # 128-bit Selection Alert sequence = 0x19BC0EA2 E3DDAFE9 86852D95 6209F392
+        # activation code sequence: swd = 0xA1, jtag = 0xA0
+        'dormant_to_swd': (0x98, [
+            0xFF,
+            0x92, 0xF3, 0x09, 0x62,
+            0x95, 0x2D, 0x85, 0x86,
+            0xE9, 0xAF, 0xDD, 0xE3,
+            0xA2, 0x0E, 0xBC, 0x19,
+            0xA0, 0x01,
+        ]),
+        'dormant_to_jtag': (0x98, [
+            0xFF,
+            0x92, 0xF3, 0x09, 0x62,
+            0x95, 0x2D, 0x85, 0x86,
+            0xE9, 0xAF, 0xDD, 0xE3,
+            0xA2, 0x0E, 0xBC, 0x19,
+            0xA0, 0x00
+        ]),
+    }
 
-        return True
+    def _swd_start_sequence_commands(self):
+        """
+        构建SWD开始序列的命令列表：复位序列 + 0xE79E + 复位序列 + 空闲序列
+        """
+        return [
+            self._swj_sequence_command(*self.SWJ_SEQUENCES['reset']),
+            self._swj_sequence_command(*self.SWJ_SEQUENCES['switch_swd']),
+            self._swj_sequence_command(*self.SWJ_SEQUENCES['reset']),
+            self._swj_sequence_command(*self.SWJ_SEQUENCES['idle']),
+        ]
 
     def _send_swj_reset_sequence(self) -> bool:
         """
@@ -1792,66 +2115,46 @@ class DAPHandler:
         在上电复位后、 DP 从 JTAG 切换到 SWD 后或者线路处于高电平超过 50 个周期后，
         SW-DP 状态机处于复位状态。
         """
-        return self._send_swj_sequence(0x33, [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
+        return self._send_swj_sequence(*self.SWJ_SEQUENCES['reset'])
 
     def _send_swj_switch_swd_sequence(self) -> bool:
         """
         发送复位序列 + 0xE79E + 发送复位序列
         """
-        return self._send_swj_sequence(0x10, [0x9E, 0xE7])
+        return self._send_swj_sequence(*self.SWJ_SEQUENCES['switch_swd'])
 
     def _send_swj_idle_sequence(self) -> bool:
         """
         发送SWJ空闲序列
         在复位状态后线路处于低电平至少两个周期， SW-DP 状态机处于空闲状态。
         """
-        return self._send_swj_sequence(0x08, [0x00])
+        return self._send_swj_sequence(*self.SWJ_SEQUENCES['idle'])
 
     def _send_swj_jtag_to_dormant_sequence(self) -> bool:
         """
         发送SWJ JTAG到休眠序列
         至少5个周期高电平 + 0x33BBBBBA
         """
-        return self._send_swj_sequence(0x28, [0xFF, 0xBA, 0xBB, 0xBB, 0x33])
+        return self._send_swj_sequence(*self.SWJ_SEQUENCES['jtag_to_dormant'])
 
     def _send_swj_swd_to_dormant_sequence(self) -> bool:
         """
         发送SWJ SWD到休眠序列
         发送复位序列 + 0xE3BC
         """
-        return self._send_swj_sequence(0x10, [0xBC, 0xE3])
+        return self._send_swj_sequence(*self.SWJ_SEQUENCES['swd_to_dormant'])
 
     def _send_swj_dormant_to_swd_sequence(self) -> bool:
         """
-        至少8个周期高电平 + 128-bit Selection Alert sequence + 4个周期低电平 + activation code sequence
-        128-bit Selection Alert sequence = 0x19BC0EA2 E3DDAFE9 86852D95 6209F392
-        activation code sequence: swd = 0xA1, jtag = 0xA0
+        发送SWJ休眠到SWD序列
         """
-        data = [
-            0xFF,
-            0x92, 0xF3, 0x09, 0x62,
-            0x95, 0x2D, 0x85, 0x86,
-            0xE9, 0xAF, 0xDD, 0xE3,
-            0xA2, 0x0E, 0xBC, 0x19,
-            0xA0, 0x01,
-        ]
-        return self._send_swj_sequence(0x98, data)
+        return self._send_swj_sequence(*self.SWJ_SEQUENCES['dormant_to_swd'])
 
     def _send_swj_dormant_to_jtag_sequence(self) -> bool:
         """
-        至少8个周期高电平 + 128-bit Selection Alert sequence + 4个周期低电平 + activation code sequence
-        128-bit Selection Alert sequence = 0x19BC0EA2 E3DDAFE9 86852D95 6209F392
-        activation code sequence: swd = 0xA1, jtag = 0xA0
+        发送SWJ休眠到JTAG序列
         """
-        data = [
-            0xFF,
-            0x92, 0xF3, 0x09, 0x62,
-            0x95, 0x2D, 0x85, 0x86,
-            0xE9, 0xAF, 0xDD, 0xE3,
-            0xA2, 0x0E, 0xBC, 0x19,
-            0xA0, 0x00
-        ]
-        return self._send_swj_sequence(0x98, data)
+        return self._send_swj_sequence(*self.SWJ_SEQUENCES['dormant_to_jtag'])
 
     def _dap_transfer(self, dap_index, transfer_count, transfer_sequence, response=[]) -> bool:
         """
@@ -1861,43 +2164,116 @@ class DAPHandler:
         :param transfer_request: 传输请求列表
         :param transfer_data: 传输数据列表（仅对写操作、值匹配读操作、匹配掩码写操作需要）
         """
-        command = self._transfer_command(dap_index, transfer_count, transfer_sequence)
+        command = self._pack_transfer_command(dap_index, transfer_count, transfer_sequence)
+        if self._submit_command(command, self._on_store_response, response) is False:
+            return False
+        return self._flush_commands()
+
+    def _submit_command(self, command, callback=None, *args) -> bool:
+        """
+        发送一条命令但不等待响应，响应到达后按发送顺序调用callback(response, read_len, *args)
+        探针中未处理的命令达到dap_packet_count时，先处理最早一条命令的响应再发送
+        回调返回False表示响应错误，此时队列中剩余的响应会被读走丢弃
+        :param command: 命令数据
+        :param callback: 响应回调函数，为None时只读走响应
+        :return: 命令发送成功且此前处理的响应均正确时返回True
+        """
+        if self._lost_responses:
+            self._abort_transfer()
+        if len(self._pending_commands) >= self.dap_packet_count:
+            if self._complete_command() is False:
+                return False
         write_len = self.usb_device_handle.send_data_to_dap_device(command, timeout=100)
         if write_len != len(command):
+            logging.error("Failed to send DAP command.")
+            self._discard_commands()
             return False
+        self._pending_commands.append((callback, args))
+        return True
 
-        buffer = usb.util.create_buffer(self.dap_packet_size)
-        read_len = self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
+    def _complete_command(self) -> bool:
+        """
+        读取最早一条未处理命令的响应并调用其回调函数
+        """
+        callback, args = self._pending_commands.popleft()
+        if len(self._response_buffer) < self.dap_packet_size:
+            self._response_buffer = usb.util.create_buffer(self.dap_packet_size)
+        read_len = self.usb_device_handle.receive_data_from_dap_device(self._response_buffer, timeout=100)
         if read_len is None or read_len == 0:
+            logging.error("Failed to receive DAP response.")
+            self._lost_responses += 1
+            self._discard_commands()
             return False
+        if callback is not None and callback(memoryview(self._response_buffer), read_len, *args) is False:
+            self._discard_commands()
+            return False
+        return True
 
-        # 清空并填充响应数据
-        response.clear()
-        response.extend(buffer[:])
+    def _flush_commands(self) -> bool:
+        """
+        处理命令队列中所有未处理命令的响应
+        """
+        while self._pending_commands:
+            if self._complete_command() is False:
+                return False
+        return True
 
+    def _abort_transfer(self) -> bool:
+        """
+        发送DAP_TransferAbort中止探针中正在执行的传输，并读走读取超时的命令迟到的响应
+        DAP_TransferAbort本身没有响应，被中止的传输仍会返回响应
+        :return: 迟到的响应全部读走时返回True
+        """
+        self._discard_commands()
+        if len(self._response_buffer) < self.dap_packet_size:
+            self._response_buffer = usb.util.create_buffer(self.dap_packet_size)
+        self.usb_device_handle.send_data_to_dap_device(self.TRANSFER_ABORT_COMMAND, timeout=100)
+        while self._lost_responses:
+            read_len = self.usb_device_handle.receive_data_from_dap_device(self._response_buffer, timeout=1000)
+            if read_len is None or read_len == 0:
+                logging.error("DAP response lost after transfer abort.")
+                self._lost_responses = 0
+                return False
+            self._lost_responses -= 1
         return True
 
-    def _dap_transfer_block_write(self, dap_index, transfer_count, transfer_request, transfer_data=None) -> bool:
+    def _discard_commands(self):
         """
-        执行DAP块传输
-        :param dap_index: JTAG设备的索引（SWD模式忽略）
-        :param transfer_count: 传输数量 (1..65535)
-        :param transfer_request: 传输请求字节
-        :param transfer_data: 传输数据列表（仅对写操作需要）
+        出错时读走探针中剩余的响应，保证后续命令与响应一一对应
+        读取超时的响应计入_lost_responses，在发送下一条命令前由_abort_transfer处理
         """
-        command = self._transfer_block_command(dap_index, transfer_count, transfer_request, transfer_data)
-        write_len = self.usb_device_handle.send_data_to_dap_device(command, timeout=100)
-        if write_len != len(command):
-            return False
+        for _ in range(len(self._pending_commands)):
+            read_len = self.usb_device_handle.receive_data_from_dap_device(self._response_buffer, timeout=100)
+            if read_len is None or read_len == 0:
+                self._lost_responses += 1
+        self._pending_commands.clear()
 
+    def _on_store_response(self, response: memoryview, read_len, response_list: list) -> bool:
+        """
+        保存完整响应数据的回调，用于同步的_dap_transfer
+        """
+        # 清空并填充响应数据
+        response_list.clear()
+        response_list.extend(response)
         return True
 
-    def _dap_transfer_block_read(self, buffer) -> int:
-        read_len = self.usb_device_handle.receive_data_from_dap_device(buffer, timeout=100)
-        if read_len is None or read_len < 3:
-            return 0
-        read_len = (buffer[1] | buffer[2] << 8) * 4 + 3
-        return read_len
+    def _on_transfer_response(self, response: memoryview, read_len, transfer_count, values=None, read_count=0) -> bool:
+        """
+        DAP_Transfer命令的响应回调，检查传输是否全部成功
+        :param transfer_count: 命令中的传输数量
+        :param values: 不为None时，响应中的读取数据按32位整数追加到该列表
+        :param read_count: 命令中的读操作数量
+        """
+        if self._check_dap_transfer_response(response[0:3]) != self.TRANSFER_RESPONSE['OK'] or \
+                response[1] != transfer_count:
+            logging.error(f"DAP transfer failed, response: 0x{response[2]:02X}")
+            return False
+        if values is not None:
+            if read_len < 3 + read_count * 4:
+                logging.error("DAP transfer response is too short.")
+                return False
+            values.extend(struct.unpack_from(f'<{read_count}I', response, 3))
+        return True
 
     def _check_dap_transfer_response(self, response):
         if response[0] != 0x05:
@@ -1906,6 +2282,11 @@ class DAPHandler:
 
         match temp:
             case 1:
+                # ACK为OK时仍需检查协议错误和值不匹配
+                if response[2] & 0x08:
+                    return self.TRANSFER_RESPONSE['ERROR']
+                if response[2] & 0x10:
+                    return self.TRANSFER_RESPONSE['Mismatch']
                 return self.TRANSFER_RESPONSE['OK']
             case 2:
                 return self.TRANSFER_RESPONSE['WAIT']
@@ -1925,6 +2306,8 @@ class DAPHandler:
 
         match temp:
             case 1:
+                if response[2] & 0x08:
+                    return self.TRANSFER_RESPONSE['ERROR']
                 return self.TRANSFER_RESPONSE['OK']
             case 2:
                 return self.TRANSFER_RESPONSE['WAIT']
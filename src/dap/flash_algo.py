@@ -1,11 +1,19 @@
 import ctypes
 from elftools.elf.elffile import ELFFile
 import io
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import hashlib
 import xml.etree.ElementTree as ET
 import logging
+import multiprocessing
+import os
+import pickle
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from src.component.run_env import RunEnv
+from src.component.pack_file import PackFile
 
 
 class FlashDefine:
@@ -20,6 +28,7 @@ class FlashDefine:
 
     SECTOR_NUM = 512    # Max Number of Sector Items
     PAGE_MAX   = 65536  # Max Page Size for Programming
+    PROGRAM_BUFFER_MAX = 0x8000 # Max Size of one Program Buffer (Multi-Page)
 
     SECTOR_END = (0xFFFFFFFF, 0xFFFFFFFF)  # End of Sector
 
@@ -59,9 +68,16 @@ class FlashAlgo(ctypes.LittleEndianStructure):
         ('EraseChip',           ctypes.c_uint32),               # Pointer to Erase Chip Function
         ('EraseSector',         ctypes.c_uint32),               # Pointer to Erase Sector Function
         ('ProgramPage',         ctypes.c_uint32),               # Pointer to Program Page Function
+        ('BlankCheck',          ctypes.c_uint32),               # Pointer to Blank Check Function (0 = Not Available)
+        ('Verify',              ctypes.c_uint32),               # Pointer to Verify Function (0 = Not Available)
+        ('Read',                ctypes.c_uint32),               # Pointer to Read Function (0 = Not Available)
         ('StaticBase',          ctypes.c_uint32),               # Static Base Address
         ('ProgramBuffer',       ctypes.c_uint32),               # Pointer to Program Buffer
         ('ProgramBufferSize',   ctypes.c_uint32),               # Size of Program Buffer
+        ('ProgramBuffer2',      ctypes.c_uint32),               # Pointer to Second Program Buffer (0 = Not Available)
+        ('ProgramPages',        ctypes.c_uint32),               # Pointer to Multi-Page Program Function
+        ('EraseSectors',        ctypes.c_uint32),               # Pointer to Sector List Erase Function
+        ('Crc32',               ctypes.c_uint32),               # Pointer to CRC32 Function
         ('BreakPoint',          ctypes.c_uint32),               # Pointer to Breakpoint Function
         ('StackPointer',        ctypes.c_uint32),               # Stack Pointer
     ]
@@ -114,9 +130,10 @@ class ParseElfFile(ELFFile):
                 return False
             self.algo_blob, algo_size, static_base = data
 
-            ram_base_addr = self._get_ram_base_addr()
-            if self.ram_base_addr != 0:
+            ram_base_addr, ram_size = self._get_ram_info()
+            if self.ram_base_addr != 0 and self.ram_base_addr != ram_base_addr:
                 ram_base_addr = self.ram_base_addr
+                ram_size = 0 # 指定的RAM基地址大小未知
 
             header_size = 32 # 中断halt程序大小
 
@@ -129,13 +146,38 @@ class ParseElfFile(ELFFile):
             self.flash_algo.EraseChip = symbols['EraseChip'].value + ram_base_addr + header_size
             self.flash_algo.EraseSector = symbols['EraseSector'].value + ram_base_addr + header_size
             self.flash_algo.ProgramPage = symbols['ProgramPage'].value + ram_base_addr + header_size
+            # 可选函数，算法未提供时为0
+            for name in ('BlankCheck', 'Verify', 'Read'):
+                if name in symbols:
+                    setattr(self.flash_algo, name, symbols[name].value + ram_base_addr + header_size)
             self.flash_algo.StaticBase = static_base + ram_base_addr + header_size
 
+            # 在算法后追加多页编程程序
+            self.flash_algo.ProgramPages = self._append_algo_stub(self.PROGRAM_PAGES_CODE, self.flash_algo.ProgramPage | 1)
+            self.flash_algo.EraseSectors = self._append_algo_stub(self.ERASE_SECTORS_CODE, self.flash_algo.EraseSector | 1)
+            self.flash_algo.Crc32 = self._append_algo_stub(self.CRC32_CODE, *self.CRC32_TABLE)
+            self.flash_algo.AlgoSize = len(self.algo_blob) * 4
+            self.flash_algo.AlgoBlob = (ctypes.c_uint32 * (len(self.algo_blob)))(*self.algo_blob)
+            algo_size = self.flash_algo.AlgoSize
+
             self.flash_algo.ProgramBuffer = ram_base_addr + (algo_size if algo_size % 4 == 0 else (algo_size + (4 - algo_size % 4)))
             self.flash_algo.ProgramBufferSize = self.flash_device.szPage
 
+            # RAM足够时分配两个编程缓冲区，烧录时交替使用；每个缓冲区按RAM大小尽量容纳多页
+            self.flash_algo.ProgramBuffer2 = 0
+            if ram_size:
+                free_size = ram_base_addr + ram_size - self.flash_algo.ProgramBuffer - 0x400 # 预留1KB栈
+                if free_size >= self.flash_device.szPage * 2:
+                    buffer_size = min(FlashDefine.PROGRAM_BUFFER_MAX, free_size // 2)
+                    buffer_size -= buffer_size % self.flash_device.szPage
+                    self.flash_algo.ProgramBufferSize = max(buffer_size, self.flash_device.szPage)
+                    self.flash_algo.ProgramBuffer2 = self.flash_algo.ProgramBuffer + self.flash_algo.ProgramBufferSize
+            stack_base = self.flash_algo.ProgramBuffer + self.flash_algo.ProgramBufferSize
+            if self.flash_algo.ProgramBuffer2:
+                stack_base += self.flash_algo.ProgramBufferSize
+
             self.flash_algo.BreakPoint = ram_base_addr + 1 # Thumb mode
-            self.flash_algo.StackPointer = self.flash_algo.ProgramBuffer + self.flash_algo.ProgramBufferSize + 0x400 # 1KB stack
+            self.flash_algo.StackPointer = (stack_base + 0x400) & ~0x7 # 1KB stack, AAPCS要求8字节对齐
             if self.print_info:
                 self._print_flash_device_info()
                 self._print_flash_algo_info()
@@ -173,12 +215,30 @@ class ParseElfFile(ELFFile):
         logging.info(f"\tEraseChip: 0x{self.flash_algo.EraseChip:08X}")
         logging.info(f"\tEraseSector: 0x{self.flash_algo.EraseSector:08X}")
         logging.info(f"\tProgramPage: 0x{self.flash_algo.ProgramPage:08X}")
+        logging.info(f"\tBlankCheck: 0x{self.flash_algo.BlankCheck:08X}")
+        logging.info(f"\tVerify: 0x{self.flash_algo.Verify:08X}")
+        logging.info(f"\tRead: 0x{self.flash_algo.Read:08X}")
+        logging.info(f"\tProgramPages: 0x{self.flash_algo.ProgramPages:08X}")
+        logging.info(f"\tEraseSectors: 0x{self.flash_algo.EraseSectors:08X}")
+        logging.info(f"\tCrc32: 0x{self.flash_algo.Crc32:08X}")
         logging.info(f"\tStaticBase: 0x{self.flash_algo.StaticBase:08X}")
         logging.info(f"\tProgramBuffer: 0x{self.flash_algo.ProgramBuffer:08X}")
         logging.info(f"\tProgramBufferSize: {self.flash_algo.ProgramBufferSize} bytes")
+        logging.info(f"\tProgramBuffer2: 0x{self.flash_algo.ProgramBuffer2:08X}")
         logging.info(f"\tBreakPoint: 0x{self.flash_algo.BreakPoint:08X}")
         logging.info(f"\tStackPointer: 0x{self.flash_algo.StackPointer:08X}")
 
+    def _append_algo_stub(self, code, *literals) -> int:
+        """
+        在算法数据后追加一段Thumb程序，程序后紧跟literals
+        :param code: 程序代码（32位字）
+        :param literals: 程序通过PC相对寻址读取的常量（被调用函数的地址、查找表等）
+        :return: 程序的入口地址（Thumb模式）
+        """
+        addr = self.flash_algo.AlgoStart + len(self.algo_blob) * 4
+        self.algo_blob = list(self.algo_blob) + list(code) + list(literals)
+        return addr | 1
+
     def _get_elf_symbols(self, symbols: dict) -> bool:
         Symbol = namedtuple('Symbol', ('name', 'value', 'size'))
 
@@ -192,13 +252,12 @@ class ParseElfFile(ELFFile):
 
     def _get_elf_data(self):
         try:
-            with open(self.f_path, 'rb') as f:
-                data = f.read()
-                e_ident = data[:16] # Magic number and other info
-                if not (e_ident[:4] == b'\x7fELF'):
-                    logging.error("Not a valid ELF file.")
-                    return None
-                return data
+            data = PackFile.read(self.f_path)
+            e_ident = data[:16] # Magic number and other info
+            if not (e_ident[:4] == b'\x7fELF'):
+                logging.error("Not a valid ELF file.")
+                return None
+            return data
         except Exception as e:
             logging.error(f"Error reading ELF file: {e}")
             return None
@@ -292,26 +351,175 @@ class ParseElfFile(ELFFile):
                 return segment.data()[offset:offset + size]
         return None
 
-    def _get_ram_base_addr(self):
+    @staticmethod
+    def get_pdsc_path(f_path: str) -> str:
+        """
+        算法文件所在pack的pdsc文件路径：<packs>/<vendor>/<pack>/<vendor>.<pack>.pdsc
+        算法文件在.pack文件中时为.pack根目录下的pdsc文件
+        """
+        split = PackFile.split_path(f_path)
+        if split is not None:
+            pdsc_list = PackFile.list_pdsc(split[0])
+            return pdsc_list[0] if pdsc_list else ''
+        path = f_path.replace('\\', '/').rsplit('/', 3)
+        return f"{path[0]}/{path[1]}/{path[2]}/{path[1]}.{path[2]}.pdsc"
+
+    def _get_ram_info(self):
+        """
+        从pdsc文件获取算法可用的RAM
+        优先使用算法条目中的RAMstart/RAMsize，否则使用器件的RAM存储区
+        :return: (RAM起始地址, RAM大小)，大小未知时为0
+        """
         # 先判断路径分隔符是不是'\\'，如果是则将其替换为'/'
         if '\\' in self.f_path:
             self.f_path = self.f_path.replace('\\', '/')
-        path = self.f_path.rsplit('/', 3)
-        pdsc_path =  f"{path[0]}/{path[1]}/{path[2]}/{path[1]}.{path[2]}.pdsc"
-        pasc_data = ParsePdscFile.parse_pdsc_file(pdsc_path)
+        pdsc_path = self.get_pdsc_path(self.f_path)
+        algo_name = self.f_path.rsplit('/', 1)[-1].lower()
 
-        ram_addr = 0
+        # 找到第一个匹配的设备即停止解析
+        for dev, dev_info in ParsePdscFile.iter_pdsc_devices(pdsc_path):
+            if self.dev not in dev.lower():
+                continue
+            for algo in dev_info.get('algorithms', []):
+                if algo['file_name'] and algo['ram_start'] is not None and \
+                        algo['file_name'].replace('\\', '/').rsplit('/', 1)[-1].lower() == algo_name:
+                    return algo['ram_start'], algo['ram_size'] or 0
+            for mem, mem_info in dev_info['memories'].items():
+                if 'ram' in mem.lower():
+                    if mem_info['start'] & 0x20000000:
+                        return mem_info['start'], mem_info['size']
+
+        return 0, 0
+
+    """
+    多页编程程序，按页循环调用ProgramPage
+    int ProgramPages(adr, sz, buf, page_size)
+    r0: 编程起始地址, r1: 编程大小, r2: 数据缓冲区, r3: 页大小
+    返回0表示成功，否则为ProgramPage的返回值；最后一页不足page_size时按剩余大小编程
+    r3只为保持调用ProgramPage时栈8字节对齐（AAPCS）而压栈
+        push  {r3-r7, lr}
+        mov   r4, r0
+        mov   r5, r1
+        mov   r6, r2
+        mov   r7, r3
+        movs  r0, #0
+        cmp   r5, #0
+        beq   end
+    loop:
+        mov   r1, r7
+        cmp   r5, r7
+        bhs   full
+        mov   r1, r5
+    full:
+        mov   r0, r4
+        mov   r2, r6
+        ldr   r3, =ProgramPage
+        blx   r3
+        cmp   r0, #0
+        bne   end
+        adds  r4, r4, r7
+        adds  r6, r6, r7
+        subs  r5, r5, r7
+        bhi   loop
+    end:
+        pop   {r3-r7, pc}
+        nop
+    """
+    PROGRAM_PAGES_CODE = (
+        0x4604B5F8, 0x4616460D, 0x2000461F, 0xD00D2D00,
+        0x42BD4639, 0x4629D200, 0x46324620, 0x47984B04,
+        0xD1032800, 0x19F619E4, 0xD8F11BED, 0xBF00BDF8,
+    )
 
-        if pasc_data:
-            for dev, dev_info in pasc_data.items():
-                if self.dev in dev.lower():
-                    for mem, mem_info in dev_info['memories'].items():
-                        if 'ram' in mem.lower():
-                            if mem_info['start'] & 0x20000000:
-                                ram_addr = mem_info['start']
-                                break
+    """
+    扇区列表擦除程序，依次调用EraseSector
+    int EraseSectors(list, count)
+    r0: 扇区地址列表, r1: 扇区数量
+    返回0表示成功，否则为EraseSector的返回值，并把失败扇区的序号写入list[count]
+        push  {r4-r6, lr}
+        mov   r4, r0
+        mov   r5, r1
+        movs  r6, #0
+    loop:
+        cmp   r6, r5
+        bhs   done
+        lsls  r0, r6, #2
+        ldr   r0, [r4, r0]
+        ldr   r3, =EraseSector
+        blx   r3
+        cmp   r0, #0
+        bne   fail
+        adds  r6, #1
+        b     loop
+    fail:
+        lsls  r1, r5, #2
+        str   r6, [r4, r1]
+        b     end
+    done:
+        movs  r0, #0
+    end:
+        pop   {r4-r6, pc}
+        nop
+    """
+    ERASE_SECTORS_CODE = (
+        0x4604B570, 0x2600460D, 0xD20A42AE, 0x582000B0,
+        0x47984B05, 0xD1012800, 0xE7F53601, 0x506600A9,
+        0x2000E000, 0xBF00BD70,
+    )
 
-        return ram_addr
+    """
+    CRC32计算程序（与zlib.crc32一致），把一段内存按块计算CRC32
+    int Crc32(adr, block_size, block_count, out)
+    r0: 起始地址, r1: 块大小, r2: 块数量, r3: 结果表，每块一个字
+    返回0；使用程序后面的16项半字节查找表
+        push  {r3-r7, lr}
+        adr   r4, table
+    block:
+        cmp   r2, #0
+        beq   end
+        movs  r6, #0
+        mvns  r6, r6
+        movs  r7, r1
+    byte:
+        cmp   r7, #0
+        beq   next
+        ldrb  r5, [r0]
+        adds  r0, #1
+        eors  r6, r5
+        lsls  r5, r6, #28
+        lsrs  r5, r5, #26
+        ldr   r5, [r4, r5]
+        lsrs  r6, r6, #4
+        eors  r6, r5
+        lsls  r5, r6, #28
+        lsrs  r5, r5, #26
+        ldr   r5, [r4, r5]
+        lsrs  r6, r6, #4
+        eors  r6, r5
+        subs  r7, #1
+        b     byte
+    next:
+        mvns  r6, r6
+        stmia r3!, {r6}
+        subs  r2, #1
+        b     block
+    end:
+        movs  r0, #0
+        pop   {r3-r7, pc}
+    table:
+    """
+    CRC32_CODE = (
+        0xA40EB5F8, 0xD0172A00, 0x43F62600, 0x2F00000F,
+        0x7805D00E, 0x406E3001, 0x0EAD0735, 0x09365965,
+        0x0735406E, 0x59650EAD, 0x406E0936, 0xE7EE3F01,
+        0xC34043F6, 0xE7E53A01, 0xBDF82000,
+    )
+    CRC32_TABLE = (
+        0x00000000, 0x1DB71064, 0x3B6E20C8, 0x26D930AC,
+        0x76DC4190, 0x6B6B51F4, 0x4DB26158, 0x5005713C,
+        0xEDB88320, 0xF00F9344, 0xD6D6A3E8, 0xCB61B38C,
+        0x9B64C2B0, 0x86D3D2D4, 0xA00AE278, 0xBDBDF21C,
+    )
 
     REQUIRED_SYMBOLS = (
         'Init',
@@ -339,21 +547,81 @@ class ParseElfFile(ELFFile):
 
 
 class ParsePdscFile:
+    # pdsc解析结果缓存：{'version': CACHE_VERSION, 'packs': {pdsc路径: (mtime_ns, size, 解析结果)}}
+    # 解析结果格式变化时增加CACHE_VERSION，旧缓存自动失效
+    CACHE_VERSION = 1
+    CACHE_PATH = "./cache/pdsc_index.pkl"
+    PARALLEL_MIN_FILES = 4      # 需要解析的pdsc文件数量达到该值时使用多进程解析
+    PARALLEL_MIN_SIZE = 8 << 20 # 需要解析的pdsc文件总大小达到该值时才使用多进程，spawn启动进程的开销较大
+
     @staticmethod
     def parse_pdsc_file(pdsc_path):
-        return ParsePdscFile()._parse_pdsc_file(pdsc_path)
+        parse = ParsePdscFile()
+        cache = parse._load_cache()
+        data, changed = parse._get_pdsc_data(pdsc_path, cache, cache)
+        if changed:
+            parse._save_cache(cache)
+        return data
+
+    @staticmethod
+    def iter_pdsc_devices(pdsc_path):
+        """
+        逐个返回pdsc文件中的(设备名, 设备详细信息)，缓存有效时从缓存读取，否则流式解析
+        只查找个别设备时调用方可以提前结束迭代，不必解析整个文件
+        """
+        parse = ParsePdscFile()
+        entry = parse._load_cache().get(Path(pdsc_path).as_posix())
+        if entry is not None and entry[:2] == PackFile.get_stamp(pdsc_path):
+            yield from entry[2].items()
+        else:
+            yield from parse._iter_pdsc_devices(pdsc_path)
 
     @staticmethod
-    def get_all_device_info_from_pdsc() -> list:
-        pdsc_path =  list(Path(RunEnv.parse_path("./packs")).rglob("*.pdsc"))
+    def get_all_device_info_from_pdsc(progress_callback=None) -> list:
+        """
+        获取packs目录下所有设备的信息，缓存失效的pdsc文件使用多进程并行解析
+        :param progress_callback: 进度回调callback(已完成的pdsc数量, pdsc总数)
+        """
+        packs_dir = Path(RunEnv.parse_path("./packs"))
+        pdsc_path = list(packs_dir.rglob("*.pdsc"))
+        # 未解压的.pack文件直接读取其中的pdsc
+        for pack in packs_dir.rglob("*.pack"):
+            try:
+                pdsc_path.extend(PackFile.list_pdsc(pack))
+            except Exception as e:
+                logging.warning(f"Failed to open pack file {pack}: {e}")
         if not pdsc_path:
             logging.error("No pdsc file found in ./packs")
             return []
         all_device = []
         parse = ParsePdscFile()
+        cache = parse._load_cache()
+        # 只保留仍存在的pdsc文件，删除的pack随之从缓存中移除
+        new_cache = {}
+        stale = {}
         for pdsc in pdsc_path:
+            key = Path(pdsc).as_posix()
+            stamp = PackFile.get_stamp(pdsc)
+            entry = cache.get(key)
+            if entry is not None and entry[:2] == stamp:
+                new_cache[key] = entry
+            else:
+                stale[key] = stamp
+        cache_changed = bool(stale) or len(cache) != len(new_cache)
+        done = len(pdsc_path) - len(stale)
+        if progress_callback is not None:
+            progress_callback(done, len(pdsc_path))
+        stale_size = sum(stamp[1] for stamp in stale.values())
+        for key, data in parse._parse_pdsc_files(list(stale), stale_size):
+            new_cache[key] = (*stale[key], data)
+            done += 1
+            if progress_callback is not None:
+                progress_callback(done, len(pdsc_path))
+
+        for pdsc in pdsc_path:
+            pack_path = PackFile.split_path(pdsc)
             flm_dir = str(Path(pdsc).parent.as_posix())
-            data = parse._parse_pdsc_file(pdsc)
+            data = new_cache[Path(pdsc).as_posix()][2]
             for dev, dev_info in data.items():
                 device_info = {
                     'vendor': dev_info['from_pack']['vendor'],
@@ -362,108 +630,326 @@ class ParsePdscFile:
                     'algorithm': []
                 }
                 for algo in dev_info['algorithms']:
-                    flm = Path(algo['file_name']).name
-                    flm_path = f"{flm_dir}/{flm}"
+                    flm = Path(algo['file_name'].replace('\\', '/')).name
+                    if pack_path is not None:
+                        # .pack中的算法文件保持pdsc中的相对路径
+                        flm_path = PackFile.join_path(pack_path[0], algo['file_name'])
+                    else:
+                        flm_path = f"{flm_dir}/{flm}"
                     device_info['algorithm'].append((flm, flm_path))
                 all_device.append(device_info)
+        if cache_changed:
+            parse._save_cache(new_cache)
         return all_device
 
+    def _parse_pdsc_files(self, pdsc_list: list, total_size: int = 0):
+        """
+        解析多个pdsc文件，按完成顺序逐个返回(pdsc路径, 解析结果)
+        文件较多较大时分配到多个进程并行解析，进程池不可用时在当前进程依次解析
+        调用方是Qt工作线程，fork多线程进程可能使子进程死锁，子进程统一用spawn方式启动
+        :param total_size: pdsc文件总大小（字节）
+        """
+        workers = min(len(pdsc_list), os.cpu_count() or 1)
+        if len(pdsc_list) >= self.PARALLEL_MIN_FILES and total_size >= self.PARALLEL_MIN_SIZE and workers > 1:
+            pending = list(pdsc_list)
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    futures = {executor.submit(ParsePdscFile._parse_pdsc_worker, pdsc): pdsc for pdsc in pdsc_list}
+                    for future in as_completed(futures):
+                        pdsc = futures[future]
+                        data = future.result()
+                        pending.remove(pdsc)
+                        yield pdsc, data
+                return
+            except (BrokenProcessPool, OSError) as e:
+                logging.warning(f"Parallel pdsc parsing unavailable, fall back to serial parsing: {e}")
+                pdsc_list = pending
+        for pdsc in pdsc_list:
+            yield pdsc, self._parse_pdsc_file(pdsc)
+
+    @staticmethod
+    def _parse_pdsc_worker(pdsc_path):
+        return ParsePdscFile()._parse_pdsc_file(pdsc_path)
+
+    def _get_pdsc_data(self, pdsc_path, cache: dict, new_cache: dict):
+        """
+        获取pdsc文件的解析结果，文件的修改时间和大小与缓存一致时直接使用缓存
+        :param cache: 已有的缓存
+        :param new_cache: 保存本次结果的缓存
+        :return: (解析结果, 是否重新解析)
+        """
+        key = Path(pdsc_path).as_posix()
+        stamp = PackFile.get_stamp(pdsc_path)
+        entry = cache.get(key)
+        if entry is not None and entry[:2] == stamp:
+            new_cache[key] = entry
+            return entry[2], False
+        data = self._parse_pdsc_file(pdsc_path)
+        new_cache[key] = (*stamp, data)
+        return data, True
+
+    def _load_cache(self) -> dict:
+        cache_path = RunEnv.parse_path(self.CACHE_PATH)
+        if not os.path.isfile(cache_path):
+            return {}
+        try:
+            with open(cache_path, 'rb') as f:
+                cache = pickle.load(f)
+        except Exception as e:
+            logging.warning(f"Failed to load pdsc cache: {e}")
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != self.CACHE_VERSION:
+            return {}
+        return cache.get('packs', {})
+
+    def _save_cache(self, packs: dict):
+        cache_path = RunEnv.parse_path(self.CACHE_PATH)
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'version': self.CACHE_VERSION, 'packs': packs}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Failed to save pdsc cache: {e}")
+
     def _parse_pdsc_file(self, pdsc_path):
         """解析pdsc文件，返回设备详细信息字典"""
-        tree = ET.parse(pdsc_path)
-        root = tree.getroot()
-        parse_data = {}
-        vendor = root.findtext('vendor')
-        pack = root.findtext('name')
-        version = None
-        url = root.findtext('url')
-        # 获取最新release的version
-        releases = root.find('releases')
-        if releases is not None:
-            release = releases.find('release')
-            if release is not None:
-                version = release.attrib.get('version')
-        for family in root.findall('.//family'):
-            family_name = family.attrib.get('Dfamily')
-            vendor_id = family.attrib.get('Dvendor')
-            for subfamily in family.findall('subFamily'):
-                subfamily_name = subfamily.attrib.get('DsubFamily')
-                for device in subfamily.findall('device'):
-                    dname = device.attrib.get('Dname')
-                    if not dname:
-                        continue
-                    # memories
-                    memories = {}
-                    for mem in device.findall('memory'):
-                        mem_name = mem.attrib.get('name', mem.attrib.get('id'))
-                        if not mem_name:
-                            continue
-                        access = mem.attrib.get('access', 'rwx')
-                        access_dict = {
-                            'read': 'r' in access,
-                            'write': 'w' in access,
-                            'execute': 'x' in access,
-                            'peripheral': False,
-                            'secure': False,
-                            'non_secure': False,
-                            'non_secure_callable': False
-                        }
-                        memories[mem_name] = {
-                            'p_name': None,
-                            'access': access_dict,
-                            'start': int(mem.attrib.get('start', '0'), 0),
-                            'size': int(mem.attrib.get('size', '0'), 0),
-                            'startup': mem.attrib.get('startup', '0') == '1',
-                            'default': mem.attrib.get('default', '0') == '1'
-                        }
-                    # algorithms
-                    algorithms = []
-                    for algo in device.findall('algorithm'):
-                        algorithms.append({
-                            'file_name': algo.attrib.get('name'),
-                            'start': int(algo.attrib.get('start', '0'), 0),
-                            'size': int(algo.attrib.get('size', '0'), 0),
-                            'default': algo.attrib.get('default', '0') == '1',
-                            'ram_start': int(algo.attrib.get('RAMstart', '0'), 0) if 'RAMstart' in algo.attrib else None,
-                            'ram_size': int(algo.attrib.get('RAMsize', '0'), 0) if 'RAMsize' in algo.attrib else None,
-                            'style': 'Keil'
-                        })
-                    # processors
-                    processors = []
-                    for proc in family.findall('processor'):
-                        processors.append({
-                            'core': proc.attrib.get('Dcore', ''),
-                            'fpu': proc.attrib.get('Dfpu', ''),
-                            'mpu': 'Present' if proc.attrib.get('Dmpu', '0') == '1' else 'Absent',
-                            'ap': {'Index': 0},
-                            'dp': 0,
-                            'address': None,
-                            'svd': None,
-                            'name': None,
-                            'unit': 0,
-                            'default_reset_sequence': None
-                        })
-                    # SVD
-                    svd = None
-                    debug = device.find('debug')
-                    if debug is not None:
-                        svd = debug.attrib.get('svd')
-                    # from_pack
-                    from_pack = {
-                        'vendor': vendor,
-                        'pack': pack,
-                        'version': version,
-                        'url': url
-                    }
-                    parse_data[dname] = {
-                        'name': dname,
-                        'memories': memories,
-                        'algorithms': algorithms,
-                        'processors': processors,
-                        'from_pack': from_pack,
-                        'vendor': vendor_id,
-                        'family': family_name,
-                        'sub_family': subfamily_name,
-                        'svd': svd
-                    }
-        return parse_data
+        return dict(self._iter_pdsc_devices(pdsc_path))
+
+    def _iter_pdsc_devices(self, pdsc_path):
+        """
+        流式解析pdsc文件，逐个返回(设备名, 设备详细信息)
+        处理完的元素立即清除，不构建整个文档树；family的processor可能位于device之后，
+        因此每个family结束时才返回其中的设备
+        """
+        from_pack = {
+            'vendor': None,
+            'pack': None,
+            'version': None,
+            'url': None
+        }
+        header_tags = {'vendor': 'vendor', 'name': 'pack', 'url': 'url'}
+        stack = []
+        family_devices = []
+        family_processors = []
+        family_name = None
+        vendor_id = None
+        subfamily_name = None
+        with PackFile.open(pdsc_path) as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    stack.append(elem.tag)
+                    if elem.tag == 'family':
+                        family_name = elem.attrib.get('Dfamily')
+                        vendor_id = elem.attrib.get('Dvendor')
+                        family_devices = []
+                        family_processors = []
+                    elif elem.tag == 'subFamily' and stack[-2] == 'family':
+                        subfamily_name = elem.attrib.get('DsubFamily')
+                    continue
+
+                stack.pop()
+                parent = stack[-1] if stack else None
+                if len(stack) == 1 and elem.tag in header_tags:
+                    from_pack[header_tags[elem.tag]] = elem.text or ''
+                elif elem.tag == 'release' and parent == 'releases' and len(stack) == 2:
+                    # 第一个release为最新版本
+                    if from_pack['version'] is None:
+                        from_pack['version'] = elem.attrib.get('version')
+                elif elem.tag == 'processor' and parent == 'family':
+                    family_processors.append(dict(elem.attrib))
+                elif elem.tag == 'device' and parent == 'subFamily' and len(stack) >= 2 and stack[-2] == 'family':
+                    dname = elem.attrib.get('Dname')
+                    if dname:
+                        family_devices.append((dname, self._parse_pdsc_device(elem, family_name, vendor_id, subfamily_name)))
+                    elem.clear()
+                elif elem.tag == 'family':
+                    for dname, dev_info in family_devices:
+                        dev_info['processors'] = [self._parse_pdsc_processor(attrib) for attrib in family_processors]
+                        dev_info['from_pack'] = dict(from_pack)
+                        yield dname, dev_info
+                    family_devices = []
+                    elem.clear()
+                if len(stack) == 1:
+                    # 释放已处理完的顶层元素（components、conditions等）
+                    elem.clear()
+
+    def _parse_pdsc_device(self, device, family_name, vendor_id, subfamily_name) -> dict:
+        dname = device.attrib.get('Dname')
+        # memories
+        memories = {}
+        for mem in device.findall('memory'):
+            mem_name = mem.attrib.get('name', mem.attrib.get('id'))
+            if not mem_name:
+                continue
+            access = mem.attrib.get('access', 'rwx')
+            access_dict = {
+                'read': 'r' in access,
+                'write': 'w' in access,
+                'execute': 'x' in access,
+                'peripheral': False,
+                'secure': False,
+                'non_secure': False,
+                'non_secure_callable': False
+            }
+            memories[mem_name] = {
+                'p_name': None,
+                'access': access_dict,
+                'start': int(mem.attrib.get('start', '0'), 0),
+                'size': int(mem.attrib.get('size', '0'), 0),
+                'startup': mem.attrib.get('startup', '0') == '1',
+                'default': mem.attrib.get('default', '0') == '1'
+            }
+        # algorithms
+        algorithms = []
+        for algo in device.findall('algorithm'):
+            algorithms.append({
+                'file_name': algo.attrib.get('name'),
+                'start': int(algo.attrib.get('start', '0'), 0),
+                'size': int(algo.attrib.get('size', '0'), 0),
+                'default': algo.attrib.get('default', '0') == '1',
+                'ram_start': int(algo.attrib.get('RAMstart', '0'), 0) if 'RAMstart' in algo.attrib else None,
+                'ram_size': int(algo.attrib.get('RAMsize', '0'), 0) if 'RAMsize' in algo.attrib else None,
+                'style': 'Keil'
+            })
+        # SVD
+        svd = None
+        debug = device.find('debug')
+        if debug is not None:
+            svd = debug.attrib.get('svd')
+        return {
+            'name': dname,
+            'memories': memories,
+            'algorithms': algorithms,
+            'processors': [],
+            'from_pack': None,
+            'vendor': vendor_id,
+            'family': family_name,
+            'sub_family': subfamily_name,
+            'svd': svd
+        }
+
+    def _parse_pdsc_processor(self, attrib: dict) -> dict:
+        return {
+            'core': attrib.get('Dcore', ''),
+            'fpu': attrib.get('Dfpu', ''),
+            'mpu': 'Present' if attrib.get('Dmpu', '0') == '1' else 'Absent',
+            'ap': {'Index': 0},
+            'dp': 0,
+            'address': None,
+            'svd': None,
+            'name': None,
+            'unit': 0,
+            'default_reset_sequence': None
+        }
+
+CachedFlashAlgo = namedtuple('CachedFlashAlgo', ('flash_device', 'flash_algo', 'parse_flag'))
+
+
+class FlashAlgoCache:
+    """
+    已解析烧录算法的缓存，内存和磁盘上各按LRU保留一定数量
+    键为(FLM文件内容的sha256, 器件名, 指定的RAM基地址, pdsc文件的修改时间和大小)，命中时不再解析ELF和pdsc
+    缓存的AlgoBlob包含附加的RAM程序，修改这些程序时增加CACHE_VERSION
+    """
+    CACHE_VERSION = 2
+    CACHE_PATH = "./cache/flash_algo.pkl"
+    MEMORY_SIZE = 16
+    DISK_SIZE = 64
+
+    _memory = OrderedDict()     # {键: (FlashDevice数据, FlashAlgo字段, 算法数据)}
+    _disk = None
+
+    @classmethod
+    def get(cls, f_path: str, device: str, ram_base_addr=0, print_info: bool = False):
+        """
+        获取解析后的烧录算法，未命中缓存时解析FLM文件并加入缓存
+        :return: 包含flash_device、flash_algo、parse_flag的对象
+        """
+        key = cls._get_key(f_path, device, ram_base_addr)
+        disk = cls._load_disk()
+        entry = None
+        if key is not None:
+            entry = cls._memory.get(key) or disk.get(key)
+        if entry is None:
+            parse = ParseElfFile(f_path, device, ram_base_addr, print_info)
+            if not parse.parse_flag or key is None:
+                return parse
+            entry = cls._pack_entry(parse)
+            disk[key] = entry
+            cls._trim(disk, cls.DISK_SIZE)
+            cls._save_disk()
+            algo = parse
+        else:
+            if key in disk:
+                disk.move_to_end(key)
+            algo = cls._unpack_entry(entry)
+            if print_info:
+                ParseElfFile._print_flash_device_info(algo)
+                ParseElfFile._print_flash_algo_info(algo)
+        cls._memory[key] = entry
+        cls._memory.move_to_end(key)
+        cls._trim(cls._memory, cls.MEMORY_SIZE)
+        return algo
+
+    @staticmethod
+    def _get_key(f_path: str, device: str, ram_base_addr):
+        try:
+            digest = hashlib.sha256(PackFile.read(f_path)).hexdigest()
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+        try:
+            pdsc_stamp = PackFile.get_stamp(ParseElfFile.get_pdsc_path(f_path))
+        except (OSError, IndexError, KeyError, zipfile.BadZipFile):
+            pdsc_stamp = None
+        return (digest, device.lower(), ram_base_addr, pdsc_stamp)
+
+    @staticmethod
+    def _pack_entry(parse):
+        algo_fields = {name: getattr(parse.flash_algo, name) for name, _ in FlashAlgo._fields_ if name != 'AlgoBlob'}
+        blob = ctypes.string_at(parse.flash_algo.AlgoBlob, parse.flash_algo.AlgoSize)
+        return (bytes(parse.flash_device), algo_fields, blob)
+
+    @staticmethod
+    def _unpack_entry(entry):
+        device_data, algo_fields, blob = entry
+        flash_device = FlashDevice.from_buffer_copy(device_data)
+        flash_algo = FlashAlgo()
+        for name, value in algo_fields.items():
+            setattr(flash_algo, name, value)
+        flash_algo.AlgoBlob = (ctypes.c_uint32 * (len(blob) // 4)).from_buffer_copy(blob)
+        return CachedFlashAlgo(flash_device, flash_algo, True)
+
+    @staticmethod
+    def _trim(cache: OrderedDict, size: int):
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    @classmethod
+    def _load_disk(cls) -> OrderedDict:
+        if cls._disk is not None:
+            return cls._disk
+        cls._disk = OrderedDict()
+        cache_path = RunEnv.parse_path(cls.CACHE_PATH)
+        if os.path.isfile(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    cache = pickle.load(f)
+                if isinstance(cache, dict) and cache.get('version') == cls.CACHE_VERSION:
+                    cls._disk = OrderedDict(cache.get('entries', {}))
+            except Exception as e:
+                logging.warning(f"Failed to load flash algorithm cache: {e}")
+        return cls._disk
+
+    @classmethod
+    def _save_disk(cls):
+        cache_path = RunEnv.parse_path(cls.CACHE_PATH)
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'version': cls.CACHE_VERSION, 'entries': cls._disk}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Failed to save flash algorithm cache: {e}")
@@ -1,12 +1,14 @@
 import time
 import copy
+import zlib
 import logging
 import ctypes
 from PyQt5.QtCore import QThread, pyqtSignal
 from enum import Enum
 from src.component.hex_bin_tool import HexBinTool
+from src.component.memory_image import MemoryImage
 from src.dap.dap_handle import DAPHandler
-from src.dap.flash_algo import ParseElfFile, ParsePdscFile
+from src.dap.flash_algo import FlashAlgoCache, FlashDefine, ParsePdscFile
 from src.dap.cortex_m import ExecuteOperation
 
 
@@ -22,6 +24,8 @@ class DAPLinkOperation(Enum):
     ReadFlash = "ReadFlash"
     GetDeviceInfo = "GetDeviceInfo"
     DownloadAlgorithm = "DownloadAlgorithm"
+    Verify = "Verify"
+    IndexPack = "IndexPack"
     SelectProgFile = "SelectProgFile"
     SettingsData = "SettingsData"
 
@@ -42,6 +46,10 @@ class DAPLinkSyncData:
 
 class DAPLinkHandleThread(QThread):
     dap_link_handle_sync_signal = pyqtSignal(dict)
+    # 目标上CRC32计算（半字节查表）每字节耗时约25个周期，取32个周期留出Flash等待周期的余量
+    CRC32_CYCLES_PER_BYTE = 32
+    # 计算超时时间时假定的最低内核时钟（Hz），Flash算法未配置时钟时内核可能运行在复位后的低速时钟
+    MIN_CORE_CLOCK = 2000000
     def __init__(self):
         super().__init__()
         self.dap_handle = DAPHandler()
@@ -51,13 +59,14 @@ class DAPLinkHandleThread(QThread):
         self.select_flag = False
         self.prog_file = {
             'path': '',
-            'type': '',  # 'bin', 'hex'
+            'type': '',  # 'bin', 'hex', 'elf', 'srec'
         }
         self.parse_algorithm_flag = {
             'device': '',
             'path': '',
         }
         self.settingsdata = dict()
+        self.index_progress = -1
 
     def run(self):
         time_out = 0
@@ -82,19 +91,19 @@ class DAPLinkHandleThread(QThread):
                 res = self._select_dap_device()
 
             case DAPLinkOperation.ReadID:
-                res = self._read_id()
+                res = self._run_in_dap_session(self._read_id)
 
             case DAPLinkOperation.Reset:
-                res = self._reset_target()
+                res = self._run_in_dap_session(self._reset_target)
 
             case DAPLinkOperation.Erase:
-                res = self._erase_target()
+                res = self._run_in_dap_session(self._erase_target)
 
             case DAPLinkOperation.Program:
-                res = self._program_target()
+                res = self._run_in_dap_session(self._program_target)
 
             case DAPLinkOperation.ReadFlash:
-                res = self._read_flash()
+                res = self._run_in_dap_session(self._read_flash)
 
             case DAPLinkOperation.GetDeviceInfo:
                 res = self._get_device_info()
@@ -111,6 +120,30 @@ class DAPLinkHandleThread(QThread):
             end_time = time.time()
             logging.info(f"DAPLinkHandleThread operation {operation} completed in {end_time - start_time:.2f} seconds.")
 
+    def _run_in_dap_session(self, operation_fnc) -> bool:
+        """在同一个DAP会话中执行完整操作
+
+        会话期间探针只复位、配置一次，SWD只连接一次，各子操作不再重复复位探针和重连目标，
+        操作结束后统一断开连接并释放接口。
+
+        Args:
+            operation_fnc (Callable[[], bool]): 需要执行的操作
+
+        Returns:
+            bool: 操作的返回值，连接失败时为False
+        """
+        if self._check_select_dap() is False or self.dap_handle.open_session() is False:
+            logging.error("Failed to connect to DAP device.")
+            sync_data = DAPLinkSyncData.get_sync_data()
+            sync_data['operation'] = self.sync_data.get('operation', None)
+            sync_data['status'] = False
+            self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
+            return False
+        try:
+            return operation_fnc()
+        finally:
+            self.dap_handle.close_session()
+
     def _refresh_dap_devices(self) -> bool:
         sync_data = DAPLinkSyncData.get_sync_data()
         current_dap_devices = []
@@ -193,7 +226,7 @@ class DAPLinkHandleThread(QThread):
 
     def _program_target(self) -> bool:
         if self.prog_file['path'] == '' or self.prog_file['type'] == '' \
-            or self.prog_file['type'] not in ['bin', 'hex']:
+            or self.prog_file['type'] not in ['bin', 'hex', 'elf', 'srec']:
             logging.error("no program file selected or file type error.")
             return False
         sync_data = DAPLinkSyncData.get_sync_data()
@@ -202,18 +235,28 @@ class DAPLinkHandleThread(QThread):
         prog_info = self.hex_bin_tool.get_parse_data_info()
         if self.prog_file['type'] == 'bin':
             bin_data = self.hex_bin_tool.bin_from_from_file(self.prog_file['path'])
-            bin_data = self.hex_bin_tool.check_data_to_align_4(bin_data)
             if bin_data is None:
                 logging.error("Failed to parse bin file.")
                 return False
             prog_info = bin_data
         elif self.prog_file['type'] == 'hex':
             hex_data = self.hex_bin_tool.hex_to_bin_from_file(self.prog_file['path'])
-            hex_data = self.hex_bin_tool.check_data_to_align_4(hex_data)
             if hex_data is None:
                 logging.error("Failed to parse hex file.")
                 return False
             prog_info = hex_data
+        elif self.prog_file['type'] == 'elf':
+            elf_data = self.hex_bin_tool.elf_to_bin_from_file(self.prog_file['path'])
+            if elf_data is None:
+                logging.error("Failed to parse elf file.")
+                return False
+            prog_info = elf_data
+        elif self.prog_file['type'] == 'srec':
+            srec_data = self.hex_bin_tool.srec_to_bin_from_file(self.prog_file['path'])
+            if srec_data is None:
+                logging.error("Failed to parse srec file.")
+                return False
+            prog_info = srec_data
 
         start_time = time.time()
         if self.dap_handle.target_flash_operation_init() is False:
@@ -228,72 +271,81 @@ class DAPLinkHandleThread(QThread):
             prog_info['addr'][0] = self.parse.flash_device.DevAdr
             logging.info(f"set bin file program start address to 0x{prog_info['addr'][0]:08X}")
 
+        # 数据段按页对齐，同一页或相邻页的数据段合并，空隙用擦除值填充，每页只编程一次
+        image = MemoryImage.from_parse_data(prog_info)
+        if image is None:
+            logging.error("Program data segments overlap.")
+            return False
+        prog_info = image.align(self.parse.flash_device.szPage, self.parse.flash_device.valEmpty).to_parse_data(prog_info['type'])
+
+        # 实际需要烧录的数据，增量擦除时只包含内容有变化的扇区
+        write_info = prog_info
         if self.settingsdata['dap']['erase'] == "不擦除":
-            # 检查目标下载区域是否存在非0xFF数据
-            if self._check_select_dap():
-                if self.dap_handle.config_dap_device():
-                    for i in range(prog_info['count']):
-                        buffer = []
-                        if self.dap_handle.read_target_flash(prog_info['addr'][i], prog_info['size'][i], buffer):
-                            for b in buffer:
-                                if b != 0xFFFFFFFF:
-                                    logging.error("Target flash is not empty, please erase flash before programming.")
-                                    self.dap_handle.unconfig_dap_device()
-                                    return False
-                        else:
-                            logging.error("Failed to read target flash for verification.")
-                            self.dap_handle.unconfig_dap_device()
-                            return False
-                    self.dap_handle.unconfig_dap_device()
+            # 检查目标下载区域是否已擦除
+            if self._blank_check(copy.deepcopy(sync_data), prog_info) is False:
+                logging.error("Target flash is not empty, please erase flash before programming.")
+                return False
 
         elif self.settingsdata['dap']['erase'] in ["扇区擦除", "全片擦除"]:
             if self._init(copy.deepcopy(sync_data), 1) is False:
                 return False
             if self.settingsdata['dap']['erase'] == "扇区擦除":
+                # 各数据段覆盖的扇区合并后擦除，多个数据段位于同一扇区时只擦除一次
+                sectors = []
                 for i in range(prog_info['count']):
-                    prog_addr = prog_info['addr'][i]
-                    prog_size = prog_info['size'][i]
-                    if self._erase_target_erase_auto(copy.deepcopy(sync_data), prog_info['addr'][0], prog_info['size'][0]) is False:
+                    for sector in self._get_sectors(prog_info['addr'][i], prog_info['addr'][i] + prog_info['size'][i]):
+                        if not sectors or sectors[-1] != sector:
+                            sectors.append(sector)
+                flash_device = self.parse.flash_device
+                if sum(sector[1] for sector in sectors) > flash_device.szDev - flash_device.sectors[0].szSector:
+                    if self._erase_target_erase_chip(copy.deepcopy(sync_data)) is False:
                         return False
+                elif self._erase_sectors(copy.deepcopy(sync_data), sectors) is False:
+                    return False
             elif self.settingsdata['dap']['erase'] == "全片擦除":
                 if self._erase_target_erase_chip(copy.deepcopy(sync_data)) is False:
                     return False
             if self._uninit(copy.deepcopy(sync_data), 1) is False:
                 return False
 
-        if self._init(copy.deepcopy(sync_data), 2) is False:
-            return False
+        elif self.settingsdata['dap']['erase'] == "增量擦除":
+            changed_sectors = self._get_changed_sectors(copy.deepcopy(sync_data), prog_info)
+            if changed_sectors is False:
+                return False
+            write_info = self._get_sectors_prog_info(prog_info, changed_sectors)
+            if changed_sectors:
+                if self._init(copy.deepcopy(sync_data), 1) is False:
+                    return False
+                if self._erase_sectors(copy.deepcopy(sync_data), changed_sectors) is False:
+                    return False
+                if self._uninit(copy.deepcopy(sync_data), 1) is False:
+                    return False
 
         total_size = 0
         for i in range(prog_info['count']):
-            prog_addr = prog_info['addr'][i]
-            prog_size = prog_info['size'][i]
-            prog_data = prog_info['data'][i]
-            total_size += prog_size
-            if prog_size == 0:
-                continue
-            if self._program(copy.deepcopy(sync_data), prog_addr, prog_size, prog_data) is False:
-                return False
+            total_size += prog_info['size'][i]
 
-        if self._uninit(copy.deepcopy(sync_data), 2) is False:
-            return False
+        if write_info['count'] > 0:
+            if self._init(copy.deepcopy(sync_data), 2) is False:
+                return False
 
-        if self.settingsdata['dap']['verify'] is True:
-            logging.info("start program verify...")
-            for i in range(prog_info['count']):
-                prog_addr = prog_info['addr'][i]
-                prog_size = prog_info['size'][i]
-                prog_data = prog_info['data'][i]
+            for i in range(write_info['count']):
+                prog_addr = write_info['addr'][i]
+                prog_size = write_info['size'][i]
+                prog_data = write_info['data'][i]
                 if prog_size == 0:
                     continue
-                verify_data = self.hex_bin_tool.bytes_to_dword(prog_data, prog_size, format='little')
-                if verify_data is None:
-                    logging.error("program verify data error.")
-                    return False
-                verify_value = self.dap_handle.get_xor_value(verify_data, len(verify_data))
-                if self.dap_handle.verify_target_data(prog_addr, prog_size, verify_value) is False:
-                    logging.error("program verify error.")
+                if self._program(copy.deepcopy(sync_data), prog_addr, prog_size, prog_data) is False:
                     return False
+
+            if self._uninit(copy.deepcopy(sync_data), 2) is False:
+                return False
+
+        if self.settingsdata['dap']['verify'] is True:
+            logging.info("start program verify...")
+            if self._verify(copy.deepcopy(sync_data), prog_info) is False:
+                logging.error("program verify error.")
+                return False
             logging.info("program verify success.")
 
         if self.dap_handle.target_flash_operation_uninit() is False:
@@ -332,11 +384,11 @@ class DAPLinkHandleThread(QThread):
 
         read_size = read_end_addr - read_start_addr
         real_read_size = read_size if read_size % 4 == 0 else (read_size + (4 - read_size % 4))
-        buffer = []
         if self._check_select_dap():
             if self.dap_handle.config_dap_device():
-                if self.dap_handle.read_target_flash(read_start_addr, real_read_size, buffer):
-                    sync_data['data'] = [buffer.copy(), read_start_addr, read_size]
+                buffer = self.dap_handle.read_target_flash(read_start_addr, real_read_size)
+                if buffer is not False:
+                    sync_data['data'] = [buffer, read_start_addr, read_size]
                     sync_data['status'] = True
                     sync_data['progress'] = 100
                 self.dap_handle.unconfig_dap_device()
@@ -445,24 +497,53 @@ class DAPLinkHandleThread(QThread):
         self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
         return res
 
+    def _erase_sectors(self, sync_data, sectors) -> bool:
+        """擦除扇区列表，连续且大小相同的扇区一次擦除
+
+        Args:
+            sync_data (DAPLinkSyncData): 同步操作数据
+            sectors (list): [(扇区地址, 扇区大小), ...]，按地址排序
+
+        Returns:
+            bool: true: 成功, false: 失败
+        """
+        sync_data['suboperation'] = DAPLinkOperation.Erase
+        erase_runs = []
+        for sector_addr, sector_size in sectors:
+            if erase_runs and erase_runs[-1][2] == sector_size and \
+                erase_runs[-1][0] + erase_runs[-1][1] * sector_size == sector_addr:
+                erase_runs[-1][1] += 1
+            else:
+                erase_runs.append([sector_addr, 1, sector_size])
+        for erase_addr, erase_num, sector_size in erase_runs:
+            if self._erase_target_erase_sector(copy.deepcopy(sync_data), erase_addr, erase_num, sector_size) is False:
+                return False
+        return True
+
     def _erase_target_erase_sector(self, sync_data, start_addr, erase_num, sector_size) -> bool:
         res = False
+        # 扇区地址列表下载到编程缓冲区，由目标上的程序依次擦除，列表末尾预留一个字保存失败扇区的序号
+        list_num = self.parse.flash_algo.ProgramBufferSize // 4 - 1
         exec_data = ExecuteOperation()
+        exec_data.r9 = self.parse.flash_algo.StaticBase
+        exec_data.r13 = self.parse.flash_algo.StackPointer
+        exec_data.r14 = self.parse.flash_algo.BreakPoint
+        exec_data.r15 = self.parse.flash_algo.EraseSectors
         if self._check_select_dap():
             if self.dap_handle.config_dap_device():
-                for i in range(erase_num):
+                for erase_index in range(0, erase_num, list_num):
                     sync_data['status'] = False
-                    exec_data.r0 = start_addr + sector_size * i
-                    exec_data.r9 = self.parse.flash_algo.StaticBase
-                    exec_data.r13 = self.parse.flash_algo.StackPointer
-                    exec_data.r14 = self.parse.flash_algo.BreakPoint
-                    exec_data.r15 = self.parse.flash_algo.EraseSector
-                    exec_data.timeout = self.parse.flash_device.toErase
-                    if self.dap_handle.target_flash_erase(exec_data):
+                    count = min(list_num, erase_num - erase_index)
+                    sector_list = [start_addr + sector_size * (erase_index + i) for i in range(count)] + [0]
+                    if self.dap_handle.download_data_to_prog_ram(self.parse.flash_algo.ProgramBuffer,
+                                                                 sector_list, len(sector_list) * 4) is False:
+                        break
+                    exec_data.timeout = self.parse.flash_device.toErase * count
+                    if self.dap_handle.target_flash_erase_sectors(exec_data, self.parse.flash_algo.ProgramBuffer, count):
                         sync_data['status'] = True
-                        sync_data['progress'] = int((i + 1) * 100 / erase_num)
+                        sync_data['progress'] = int((erase_index + count) * 100 / erase_num)
                         self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
-                        if i == (erase_num - 1):
+                        if erase_index + count == erase_num:
                             res = True
                     else:
                         break
@@ -487,58 +568,341 @@ class DAPLinkHandleThread(QThread):
             logging.error("Program size out of range.")
             return False
 
+        # 每次下载一个编程缓冲区大小的数据，由目标上的多页编程程序按页编程
         page_size = self.parse.flash_algo.ProgramBufferSize
-        if page_size % 4 != 0:
+        if page_size % 4 != 0 or self.parse.flash_device.szPage % 4 != 0:
             logging.error("Flash page size is not aligned to 4 bytes.")
             return False
 
+        # 有第二个编程缓冲区时交替使用：目标编程当前页的同时下载下一页
+        prog_buffers = [self.parse.flash_algo.ProgramBuffer]
+        if self.parse.flash_algo.ProgramBuffer2:
+            prog_buffers.append(self.parse.flash_algo.ProgramBuffer2)
+        pages = [(offset, min(page_size, prog_size - offset)) for offset in range(0, prog_size, page_size)]
+
         exec_data = ExecuteOperation()
-        exec_data.r2 = self.parse.flash_algo.ProgramBuffer
         exec_data.r9 = self.parse.flash_algo.StaticBase
         exec_data.r13 = self.parse.flash_algo.StackPointer
         exec_data.r14 = self.parse.flash_algo.BreakPoint
-        exec_data.r15 = self.parse.flash_algo.ProgramPage
-        exec_data.timeout = self.parse.flash_device.toProg
+        exec_data.r15 = self.parse.flash_algo.ProgramPages
+        exec_data.timeout = self.parse.flash_device.toProg * (page_size // self.parse.flash_device.szPage)
         if self._check_select_dap():
             if self.dap_handle.config_dap_device():
-                for i in range(prog_size // page_size):
+                # data可以是memoryview、PaddedView或bytearray，按页切片后按32位字视图下载，不复制整个数据
+                data_view = data
+                for i, (data_offset, write_size) in enumerate(pages):
                     sync_data['status'] = False
-                    data_offset = i * page_size
-                    temp = data[data_offset : data_offset + page_size]
-                    write_data = self.hex_bin_tool.bytes_to_dword(temp, page_size)
-                    if write_data is None:
-                        return False
-                    if self.dap_handle.download_data_to_prog_ram(self.parse.flash_algo.ProgramBuffer, write_data, page_size):
-                        exec_data.r0 = start_addr + i * page_size
-                        exec_data.r1 = page_size
-                        if self.dap_handle.target_flash_program(exec_data):
-                            sync_data['status'] = True
-                            sync_data['progress'] = int((i + 1) * 100 / ((prog_size + page_size - 1) // page_size))
-                            self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
-                            if i == (prog_size // page_size - 1):
-                                res = True
-                        else:
-                            return False
+                    prog_buffer = prog_buffers[i % len(prog_buffers)]
+                    if i == 0 or len(prog_buffers) == 1:
+                        write_data = self.hex_bin_tool.bytes_to_word_view(data_view[data_offset : data_offset + write_size])
+                        if write_data is None or \
+                           self.dap_handle.download_data_to_prog_ram(prog_buffer, write_data, write_size) is False:
+                            break
+                    exec_data.r0 = start_addr + data_offset
+                    exec_data.r1 = write_size
+                    exec_data.r2 = prog_buffer
+                    exec_data.r3 = self.parse.flash_device.szPage
+                    if self.dap_handle.target_flash_program_start(exec_data) is False:
+                        break
+                    download_res = True
+                    if len(prog_buffers) > 1 and i + 1 < len(pages):
+                        next_offset, next_size = pages[i + 1]
+                        write_data = self.hex_bin_tool.bytes_to_word_view(data_view[next_offset : next_offset + next_size])
+                        download_res = write_data is not None and \
+                                       self.dap_handle.download_data_to_prog_ram(prog_buffers[(i + 1) % len(prog_buffers)],
+                                                                                 write_data, next_size)
+                    if self.dap_handle.target_flash_program_wait(exec_data) is False or download_res is False:
+                        break
+                    sync_data['status'] = True
+                    sync_data['progress'] = int((i + 1) * 100 / len(pages))
+                    self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
+                    if i == len(pages) - 1:
+                        res = True
+                self.dap_handle.unconfig_dap_device()
+        return res
+
+    def _is_memory_mapped(self) -> bool:
+        """存储器是否映射在内核地址空间，可由目标上的程序直接按地址读取
+
+        Returns:
+            bool: 片内flash和并行总线外部flash为True，SPI外部flash和未知类型为False
+        """
+        dev_type = self.parse.flash_device.DevType
+        return 0 < dev_type < FlashDefine.TYPE.index('EXTSPI')
+
+    def _get_crc32_timeout(self, size) -> int:
+        """计算目标上校验一段数据的超时时间
+
+        按CRC32每字节周期数和最低内核时钟估算，校验（Verify）和查空（BlankCheck）不慢于CRC32
+
+        Args:
+            size (int): 数据大小
+
+        Returns:
+            int: 超时时间（ms）
+        """
+        cycles_per_ms = self.MIN_CORE_CLOCK // 1000
+        return 100 + (size * self.CRC32_CYCLES_PER_BYTE + cycles_per_ms - 1) // cycles_per_ms
+
+    def _get_sectors(self, start_addr, end_addr) -> list:
+        """计算地址区间覆盖的扇区
+
+        Args:
+            start_addr (int): 起始地址
+            end_addr (int): 结束地址（不包含）
+
+        Returns:
+            list: [(扇区地址, 扇区大小), ...]
+        """
+        flash_device = self.parse.flash_device
+        flash_end_addr = flash_device.DevAdr + flash_device.szDev
+        sectors = []
+        for i in range(flash_device.numSec):
+            sector_size = flash_device.sectors[i].szSector
+            area_start = flash_device.DevAdr + flash_device.sectors[i].AddrSector
+            if i + 1 < flash_device.numSec:
+                area_end = flash_device.DevAdr + flash_device.sectors[i + 1].AddrSector
+            else:
+                area_end = flash_end_addr
+            if sector_size == 0 or end_addr <= area_start or start_addr >= area_end:
+                continue
+            sector_addr = area_start
+            if start_addr > area_start:
+                sector_addr += (start_addr - area_start) // sector_size * sector_size
+            while sector_addr < min(end_addr, area_end):
+                sectors.append((sector_addr, sector_size))
+                sector_addr += sector_size
+        return sectors
+
+    def _get_changed_sectors(self, sync_data, prog_info):
+        """找出内容与烧录数据不同的扇区
+
+        每个扇区中烧录数据覆盖的部分由目标上的程序计算CRC32，与主机端的zlib.crc32比较，
+        连续且大小相同的区域一次计算
+
+        Args:
+            sync_data (DAPLinkSyncData): 同步操作数据
+            prog_info (dict): 烧录数据信息
+
+        Returns:
+            list: 需要重新擦除、烧录的扇区[(扇区地址, 扇区大小), ...]，失败时返回False
+        """
+        max_count = self.parse.flash_algo.ProgramBufferSize // 4
+        sectors = []
+        # 按扇区切分烧录数据：[扇区, 数据段序号, 段内偏移, 大小]
+        blocks = []
+        for i in range(prog_info['count']):
+            prog_addr = prog_info['addr'][i]
+            prog_size = prog_info['size'][i]
+            if prog_size == 0:
+                continue
+            for sector_addr, sector_size in self._get_sectors(prog_addr, prog_addr + prog_size):
+                block_start = max(sector_addr, prog_addr)
+                block_end = min(sector_addr + sector_size, prog_addr + prog_size)
+                if not sectors or sectors[-1] != (sector_addr, sector_size):
+                    sectors.append((sector_addr, sector_size))
+                blocks.append([len(sectors) - 1, i, block_start - prog_addr, block_end - block_start])
+        if not blocks:
+            return []
+        # 同一数据段内连续、大小相同的块合并为一次计算
+        groups = []
+        for block in blocks:
+            group = groups[-1] if groups else None
+            if group and group[0][1] == block[1] and group[0][3] == block[3] and len(group) < max_count and \
+                group[-1][2] + group[-1][3] == block[2]:
+                group.append(block)
+            else:
+                groups.append([block])
+
+        changed = set()
+        exec_data = ExecuteOperation()
+        exec_data.r9 = self.parse.flash_algo.StaticBase
+        exec_data.r13 = self.parse.flash_algo.StackPointer
+        exec_data.r14 = self.parse.flash_algo.BreakPoint
+        exec_data.r15 = self.parse.flash_algo.Crc32
+        res = False
+        if self._check_select_dap():
+            if self.dap_handle.config_dap_device():
+                res = True
+                for group in groups:
+                    _, index, offset, block_size = group[0]
+                    exec_data.timeout = self._get_crc32_timeout(block_size * len(group))
+                    crc_values = self.dap_handle.target_crc32(exec_data, prog_info['addr'][index] + offset, block_size,
+                                                              len(group), self.parse.flash_algo.ProgramBuffer)
+                    if crc_values is False:
+                        res = False
+                        break
+                    data_view = prog_info['data'][index]
+                    for (sector_index, _, block_offset, _), crc_value in zip(group, crc_values):
+                        if crc_value != zlib.crc32(data_view[block_offset : block_offset + block_size]):
+                            changed.add(sector_index)
+                self.dap_handle.unconfig_dap_device()
+        if res is False:
+            logging.error("Failed to compare target flash with program data.")
+            return False
+        logging.info(f"{len(changed)}/{len(sectors)} sectors changed.")
+        return [sectors[i] for i in sorted(changed)]
+
+    def _get_sectors_prog_info(self, prog_info, sectors) -> dict:
+        """截取烧录数据中落在指定扇区内的部分
+
+        Args:
+            prog_info (dict): 烧录数据信息
+            sectors (list): [(扇区地址, 扇区大小), ...]，按地址排序
+
+        Returns:
+            dict: 与prog_info格式相同的烧录数据信息
+        """
+        ret = self.hex_bin_tool.get_parse_data_info()
+        ret['type'] = prog_info['type']
+        # 合并连续扇区
+        ranges = []
+        for sector_addr, sector_size in sectors:
+            if ranges and ranges[-1][1] == sector_addr:
+                ranges[-1][1] += sector_size
+            else:
+                ranges.append([sector_addr, sector_addr + sector_size])
+        for i in range(prog_info['count']):
+            prog_addr = prog_info['addr'][i]
+            prog_end_addr = prog_addr + prog_info['size'][i]
+            for range_start, range_end in ranges:
+                start_addr = max(range_start, prog_addr)
+                end_addr = min(range_end, prog_end_addr)
+                if start_addr >= end_addr:
+                    continue
+                ret['addr'].append(start_addr)
+                ret['size'].append(end_addr - start_addr)
+                ret['data'].append(prog_info['data'][i][start_addr - prog_addr : end_addr - prog_addr])
+        ret['count'] = len(ret['addr'])
+        return ret
+
+    def _blank_check(self, sync_data, prog_info) -> bool:
+        """检查烧录区域是否已擦除
+
+        算法提供BlankCheck函数时调用该函数，否则由目标上的程序计算CRC32，与擦除值的CRC32比较
+
+        Args:
+            sync_data (DAPLinkSyncData): 同步操作数据
+            prog_info (dict): 烧录数据信息
+
+        Returns:
+            bool: true: 已擦除, false: 未擦除或失败
+        """
+        blank_check = self.parse.flash_algo.BlankCheck
+        if blank_check and self._init(copy.deepcopy(sync_data), 1) is False:
+            return False
+        res = False
+        val_empty = self.parse.flash_device.valEmpty
+        exec_data = ExecuteOperation()
+        exec_data.r9 = self.parse.flash_algo.StaticBase
+        exec_data.r13 = self.parse.flash_algo.StackPointer
+        exec_data.r14 = self.parse.flash_algo.BreakPoint
+        exec_data.r15 = blank_check if blank_check else self.parse.flash_algo.Crc32
+        if self._check_select_dap():
+            if self.dap_handle.config_dap_device():
+                res = True
+                for i in range(prog_info['count']):
+                    prog_addr = prog_info['addr'][i]
+                    prog_size = prog_info['size'][i]
+                    if prog_size == 0:
+                        continue
+                    exec_data.timeout = self._get_crc32_timeout(prog_size)
+                    if blank_check:
+                        exec_data.r0 = prog_addr
+                        exec_data.r1 = prog_size
+                        exec_data.r2 = val_empty
+                        if self.dap_handle.target_flash_blank_check(exec_data) is False:
+                            res = False
+                            break
                     else:
-                        return False
-                rest_size = prog_size % page_size
-                if rest_size != 0:
-                    res = False
-                    sync_data['status'] = False
-                    data_offset = (prog_size // page_size) * page_size
-                    temp = data[data_offset : prog_size]
-                    write_data = self.hex_bin_tool.bytes_to_dword(temp, rest_size)
-                    if write_data is None:
-                        return False
-                    if self.dap_handle.download_data_to_prog_ram(self.parse.flash_algo.ProgramBuffer, write_data, prog_size % page_size):
-                        exec_data.r0 = start_addr + (prog_size // page_size) * page_size
-                        exec_data.r1 = prog_size % page_size
-                        if self.dap_handle.target_flash_program(exec_data):
-                            sync_data['status'] = True
-                            sync_data['progress'] = 100
-                            res = True
-                            self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
+                        crc_values = self.dap_handle.target_crc32(exec_data, prog_addr, prog_size, 1,
+                                                                  self.parse.flash_algo.ProgramBuffer)
+                        if crc_values is False or crc_values[0] != zlib.crc32(bytes([val_empty]) * prog_size):
+                            logging.error(f"Flash is not blank, address: 0x{prog_addr:08X}, size: {prog_size}.")
+                            res = False
+                            break
+                self.dap_handle.unconfig_dap_device()
+        if blank_check and self._uninit(copy.deepcopy(sync_data), 1) is False:
+            return False
+        return res
+
+    def _verify(self, sync_data, prog_info) -> bool:
+        """校验烧录数据
+
+        存储器不能直接按地址读取（SPI外部flash等）且算法提供Verify函数时，数据按编程缓冲区大小下载后
+        调用Verify函数；否则每个数据段由目标上的程序计算CRC32，与主机端的zlib.crc32比较，
+        不再下载或回读全部数据
+
+        Args:
+            sync_data (DAPLinkSyncData): 同步操作数据
+            prog_info (dict): 烧录数据信息
+
+        Returns:
+            bool: true: 成功, false: 失败
+        """
+        verify = 0
+        if not self._is_memory_mapped() or not self.parse.flash_algo.Crc32:
+            verify = self.parse.flash_algo.Verify
+        if verify and self._init(copy.deepcopy(sync_data), 3) is False:
+            return False
+        res = False
+        sync_data['suboperation'] = DAPLinkOperation.Verify
+        sync_data['status'] = False
+        buffer_size = self.parse.flash_algo.ProgramBufferSize
+        exec_data = ExecuteOperation()
+        exec_data.r9 = self.parse.flash_algo.StaticBase
+        exec_data.r13 = self.parse.flash_algo.StackPointer
+        exec_data.r14 = self.parse.flash_algo.BreakPoint
+        exec_data.r15 = verify if verify else self.parse.flash_algo.Crc32
+        if self._check_select_dap():
+            if self.dap_handle.config_dap_device():
+                res = True
+                for i in range(prog_info['count']):
+                    prog_addr = prog_info['addr'][i]
+                    prog_size = prog_info['size'][i]
+                    prog_data = prog_info['data'][i]
+                    if prog_size == 0:
+                        continue
+                    data_view = prog_data
+                    if verify:
+                        exec_data.timeout = self._get_crc32_timeout(buffer_size)
+                        for offset in range(0, prog_size, buffer_size):
+                            verify_size = min(buffer_size, prog_size - offset)
+                            if self.dap_handle.download_data_to_prog_ram(self.parse.flash_algo.ProgramBuffer,
+                                                                         data_view[offset : offset + verify_size],
+                                                                         verify_size) is False:
+                                res = False
+                                break
+                            exec_data.r0 = prog_addr + offset
+                            exec_data.r1 = verify_size
+                            exec_data.r2 = self.parse.flash_algo.ProgramBuffer
+                            if self.dap_handle.target_flash_verify(exec_data) is False:
+                                res = False
+                                break
+                        if res is False:
+                            break
+                    else:
+                        exec_data.timeout = self._get_crc32_timeout(prog_size)
+                        crc_values = self.dap_handle.target_crc32(exec_data, prog_addr, prog_size, 1,
+                                                                  self.parse.flash_algo.ProgramBuffer)
+                        if crc_values is False:
+                            res = False
+                            break
+                        # 分块计算，PaddedView不会拼接出完整数据
+                        crc_value = 0
+                        for offset in range(0, prog_size, buffer_size):
+                            crc_value = zlib.crc32(data_view[offset : offset + buffer_size], crc_value)
+                        if crc_values[0] != crc_value:
+                            logging.error(f"verify error at 0x{prog_addr:08X}, size: {prog_size}, "
+                                          f"crc32: 0x{crc_values[0]:08X}, expected: 0x{crc_value:08X}.")
+                            res = False
+                            break
+                    sync_data['status'] = True
+                    sync_data['progress'] = int((i + 1) * 100 / prog_info['count'])
+                    self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
                 self.dap_handle.unconfig_dap_device()
+        if verify and self._uninit(copy.deepcopy(sync_data), 3) is False:
+            return False
         return res
 
     def _download_algorithm(self, sync_data) -> bool:
@@ -548,12 +912,11 @@ class DAPLinkHandleThread(QThread):
         verify_flag = self.settingsdata['dap']['verify']
         if self._parse_algorithm():
             start_addr = self.parse.flash_algo.AlgoStart
-            algo = self.parse.flash_algo.AlgoBlob
             algo_size = self.parse.flash_algo.AlgoSize
-            algo_list = ctypes.cast(algo, ctypes.POINTER(ctypes.c_uint32))[:algo_size//4]
+            algo = ctypes.string_at(self.parse.flash_algo.AlgoBlob, algo_size)
             if self._check_select_dap():
                 if self.dap_handle.config_dap_device():
-                    if self.dap_handle.download_algorithm(start_addr, algo_list, algo_size, verify_flag):
+                    if self.dap_handle.download_algorithm(start_addr, algo, algo_size, verify_flag):
                         sync_data['data'] = [self.dap_handle.debug_id, self.dap_handle.ap_id, self.dap_handle.cpu_id].copy()
                         sync_data['status'] = True
                         res = True
@@ -570,7 +933,7 @@ class DAPLinkHandleThread(QThread):
         if device == self.parse_algorithm_flag['device'] and \
             f_path == self.parse_algorithm_flag['path']:
             return True
-        self.parse = ParseElfFile(f_path, device, print_info=True)
+        self.parse = FlashAlgoCache.get(f_path, device, print_info=True)
         if self.parse.parse_flag:
             self.parse_algorithm_flag['device'] = device
             self.parse_algorithm_flag['path'] = f_path
@@ -658,10 +1021,24 @@ class DAPLinkHandleThread(QThread):
         sync_data = DAPLinkSyncData.get_sync_data()
         sync_data['operation'] = DAPLinkOperation.GetDeviceInfo
         sync_data['status'] = True
-        sync_data['data'] = ParsePdscFile.get_all_device_info_from_pdsc()
+        self.index_progress = -1
+        sync_data['data'] = ParsePdscFile.get_all_device_info_from_pdsc(self._on_index_pack_progress)
         self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
         return True
 
+    def _on_index_pack_progress(self, done: int, total: int):
+        """pdsc索引进度，百分比变化时发送"""
+        progress = int(done * 100 / total) if total else 100
+        if done != total and progress == self.index_progress:
+            return
+        self.index_progress = progress
+        sync_data = DAPLinkSyncData.get_sync_data()
+        sync_data['operation'] = DAPLinkOperation.GetDeviceInfo
+        sync_data['suboperation'] = DAPLinkOperation.IndexPack
+        sync_data['status'] = True
+        sync_data['progress'] = progress
+        self.dap_link_handle_sync_signal.emit(copy.deepcopy(sync_data))
+
     def _select_prog_file(self) -> bool:
         sync_data = DAPLinkSyncData.get_sync_data()
         sync_data['operation'] = DAPLinkOperation.SelectProgFile
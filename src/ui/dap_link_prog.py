@@ -22,6 +22,7 @@ from PyQt5 import uic
 from functools import partial
 
 from src.component.run_env import RunEnv
+from src.component.hex_bin_tool import HexBinTool
 from src.ui.dap_link_prog_icon import DAPIcon
 from src.ui.dap_link_style import DAPLinkStyle
 from src.ui.input_addr_size_page import EraseDialog, ReadFlashDialog
@@ -238,12 +239,14 @@ class DAPLinkProgUI(QMainWindow):
     槽函数
     """
     def _open_file(self):
-        fpath, filter_str = QFileDialog.getOpenFileName(self, "Open File", '', "program file (*.bin *.hex);;All files (*.*)")
+        fpath, filter_str = QFileDialog.getOpenFileName(self, "Open File", '',
+                                                        "program file (*.bin *.hex *.elf *.axf *.out *.srec *.s19 *.s28 *.s37 *.mot);;"
+                                                        "All files (*.*)")
         if fpath:
             if '\\' in fpath:
                 fpath = fpath.replace('\\', '/')
-            file_type = fpath.split('.')[-1]
-            if file_type in ['bin', 'hex']:
+            file_type = HexBinTool.FILE_TYPES.get(fpath.split('.')[-1].lower(), fpath.split('.')[-1])
+            if file_type in ['bin', 'hex', 'elf', 'srec']:
                 sync_data = DAPLinkSyncData.get_sync_data()
                 sync_data['operation'] = DAPLinkOperation.SelectProgFile
                 sync_data['data'] = [fpath, file_type]
@@ -553,6 +556,10 @@ class DAPLinkProgUI(QMainWindow):
             logging.info("flash data table dialog rejected.")
 
     def _handle_sync_data_get_device_info(self, sync_data: dict):
+        if sync_data.get('suboperation'):
+            # pdsc索引进度
+            self._handle_sync_data_suboperation(sync_data)
+            return
         device_info = sync_data.get('data', [])
         settings_dialog = SettingsDialog(parent=self, settings_data=self.settings_data, device_info=device_info)
         res = settings_dialog.exec_()
@@ -604,6 +611,12 @@ class DAPLinkProgUI(QMainWindow):
             case DAPLinkOperation.Program:
                 self._handle_sync_data_progress(sync_data, "P:")
 
+            case DAPLinkOperation.Verify:
+                self._handle_sync_data_progress(sync_data, "V:")
+
+            case DAPLinkOperation.IndexPack:
+                self._handle_sync_data_progress(sync_data, "I:")
+
             case DAPLinkOperation.Reset:
                 self._handle_sync_data_reset_target(sync_data)
 
@@ -68,12 +68,16 @@ class DataTableUIBase(QDialog):
         pass
 
     def set_table_data(self, data: list, start_addr: int, size: int):
-        byte_data = []
-        for item in data:
-            byte_data.append(item & 0xFF)
-            byte_data.append((item >> 8) & 0xFF)
-            byte_data.append((item >> 16) & 0xFF)
-            byte_data.append((item >> 24) & 0xFF)
+        if isinstance(data, (bytes, bytearray)):
+            # 字节数据直接使用
+            byte_data = list(data[:size])
+        else:
+            byte_data = []
+            for item in data:
+                byte_data.append(item & 0xFF)
+                byte_data.append((item >> 8) & 0xFF)
+                byte_data.append((item >> 16) & 0xFF)
+                byte_data.append((item >> 24) & 0xFF)
         data = byte_data[:size]
         self.table_data['data'] = data
         self.table_data['addr'] = start_addr
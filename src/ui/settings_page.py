@@ -25,7 +25,7 @@ class SettingsData:
     dap = {
         'connect': "正常连接",    # 正常连接, 预先复位
         'reset': "自动",        # 自动, 软件复位, 硬件复位
-        'erase': "扇区擦除",      # 不擦除, 扇区擦除, 全片擦除
+        'erase': "扇区擦除",      # 不擦除, 扇区擦除, 全片擦除, 增量擦除（只擦除、烧录内容有变化的扇区）
         'verify': True,         # True, False
         'run': True,            # True, False
         'interface': "SWD",     # SWD, JTAG, 目标不允许选择，只支持SWD
@@ -1,5 +1,6 @@
 import usb.core
 import usb.util
+import array
 from src.usb_device.usb_device_info import USBDeviceInfo
 import logging
 
@@ -179,14 +180,18 @@ class USBDeviceHandle(USBDeviceInfo):
         if out_ep is None:
             return False
         try:
-            temp_data = data[:]
+            temp_data = data
             if self._is_hid_device(dap_device):
                 packet_size = dap_device.get('out_ep_packet_size')
-                if packet_size is not None:
-                    if len(temp_data) > packet_size:
-                        temp_data = temp_data[:packet_size]
-                    else:
-                        temp_data.extend([0x00] * (packet_size - len(temp_data)))
+                if packet_size is not None and len(data) != packet_size:
+                    # HID报告长度固定，截断或补0到端点包大小
+                    temp_data = bytearray(packet_size)
+                    data_len = min(len(data), packet_size)
+                    temp_data[:data_len] = bytes(data[:data_len])
+            elif isinstance(data, memoryview):
+                # 一次内存拷贝转换为array，避免pyusb逐字节转换
+                temp_data = array.array('B')
+                temp_data.frombytes(data)
 
             write_len = dev.write(out_ep, temp_data, timeout=timeout)
             if self._is_hid_device(dap_device):